@@ -1,27 +1,31 @@
-import streamlit as st
-import requests
-import json
+import os
 import time
-from urllib.parse import urlparse, urljoin
+SCRIPT_START = time.perf_counter()
+
+import streamlit as st
 
-# --- IMPORT DES 2 LIBRAIRIES GOOGLE (ANCIENNE ET NOUVELLE) ---
-import google.generativeai as old_genai # Pour Texte/Images (Gemini 2.0 Flash / Nano Banana)
-from google import genai                # Pour Vidéo (Veo 3.1)
-from google.genai import types          # Types pour Veo
+from backend import configure, is_configured, get_brand_data, get_video_jobs, run_step3_generation
+from cache import cache_stats
+from clients import provider_mode
+from metrics import REGISTRY as METRICS, observe
+from singleflight import FLIGHTS
+from media_store import get_media_store
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Project One", layout="wide", initial_sidebar_state="collapsed")
 
-# Load API Keys
-try:
-    SCRAPINGBEE_API_KEY = st.secrets["SCRAPINGBEE_API_KEY"]
-    GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
-except FileNotFoundError:
-    st.error("System Configuration Error: API Keys missing.")
-    st.stop()
+# Load API Keys once per process (PROJECT_ONE_PROVIDERS=mock: local stub providers, no keys needed)
+if not is_configured():
+    if provider_mode() == "mock":
+        configure("mock", "mock")
+    else:
+        try:
+            configure(st.secrets["SCRAPINGBEE_API_KEY"], st.secrets["GOOGLE_API_KEY"])
+        except FileNotFoundError:
+            st.error("System Configuration Error: API Keys missing.")
+            st.stop()
 
-# Configure Old Gemini (pour le texte et les images)
-old_genai.configure(api_key=GOOGLE_API_KEY)
+VIDEO_POLL_SECONDS = 5
 
 # --- CSS: ULTIMATE PREMIUM ---
 st.markdown("""
@@ -48,12 +52,18 @@ st.markdown("""
     .custom-loader { position: fixed; top: 0; left: 0; width: 100vw; height: 100vh; background-color: #0b0d11; z-index: 999999; display: flex; flex-direction: column; justify-content: center; align-items: center; }
     .loader-ring { width: 50px; height: 50px; border: 3px solid rgba(59, 130, 246, 0.3); border-top-color: #3b82f6; border-radius: 50%; margin-bottom: 24px; animation: spin 1s linear infinite; }
     @keyframes spin { to { transform: rotate(360deg); } }
+    .slot-loader { display: flex; align-items: center; gap: 16px; padding: 40px 0; }
+    .slot-loader .loader-ring { width: 28px; height: 28px; margin-bottom: 0; }
 
     /* UI ELEMENTS */
     .chip { display: inline-block; background: rgba(255,255,255,0.05); border: 1px solid rgba(255,255,255,0.1); padding: 6px 12px; border-radius: 4px; font-size: 0.85rem; margin-right: 8px; margin-bottom: 8px; }
     .color-swatch { width: 100%; height: 70px; border-radius: 4px; margin-bottom: 8px; border: 1px solid rgba(255,255,255,0.1); }
     .brand-img { width: 100%; height: 200px; object-fit: cover; border-radius: 4px; border: 1px solid rgba(255,255,255,0.1); transition: 0.3s; }
     .brand-img:hover { border-color: #3b82f6; }
+    .generated-img { width: 100%; height: auto; border-radius: 4px; display: block; }
+    .generated-video { width: 100%; height: auto; border-radius: 4px; display: block; background: #000; }
+    .img-download { display: inline-block; margin-top: 6px; font-size: 0.75rem; color: #6b7280 !important; text-decoration: none; text-transform: uppercase; letter-spacing: 0.05em; }
+    .img-download:hover { color: #3b82f6 !important; }
     
     /* BUTTONS */
     .stButton button, .stLinkButton a { background-color: #3b82f6 !important; color: white !important; border: none !important; border-radius: 4px !important; font-weight: 600 !important; padding: 0.8rem 2rem !important; text-transform: uppercase !important; font-size: 0.85rem !important; transition: 0.3s !important; display: inline-flex !important; justify-content: center !important; align-items: center !important; text-decoration: none !important;}
@@ -76,156 +86,82 @@ def show_header():
         </div>
     """, unsafe_allow_html=True)
 
-# --- BACKEND LOGIC ---
-
-def get_brand_data(url):
-    target_url = url if url.startswith("http") else f"https://{url}"
-    parsed_uri = urlparse(target_url)
-    clean_domain = parsed_uri.netloc
-    if clean_domain.startswith("www."): clean_domain = clean_domain[4:]
-    clean_base_url = f"{parsed_uri.scheme}://{clean_domain}"
-    google_favicon_url = f"https://www.google.com/s2/favicons?domain={clean_domain}&sz=128"
-
-    extract_rules = {
-        "projectName": "The official name of the company.",
-        "tagline": "The main slogan found in the hero section.",
-        "industry": "The specific industry sector.",
-        "concept": "A 50-word summary of what the business does.",
-        "colors": {"description": "list of 5 brand colors", "type": "list", "output": {"hex_code": "Hex code"}},
-        "fonts": {"description": "List of 2 font families", "type": "list", "output": {"font_name": "Name", "use": "Use"}},
-        "aesthetic": {"description": "4 adjectives for visual style", "type": "list", "output": {"keyword": "Adjective"}},
-        "values": {"description": "4 brand values", "type": "list", "output": {"value": "Value"}},
-        "tone": {"description": "4 tone keywords", "type": "list", "output": {"keyword": "Tone"}},
-        "images": {"description": "4 distinct image URLs", "type": "list", "output": {"src": "URL", "alt": "Alt"}}
-    }
-
-    params = {
-        "api_key": SCRAPINGBEE_API_KEY,
-        "url": target_url,
-        "block_resources": "false",
-        "render_js": "true",
-        "wait": "4000",
-        "ai_extract_rules": json.dumps(extract_rules)
-    }
-
-    try:
-        response = requests.get("https://app.scrapingbee.com/api/v1", params=params)
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                data['logo'] = google_favicon_url
-                if data.get('images'):
-                    for img in data['images']:
-                        if img.get('src') and not img['src'].startswith('data:'):
-                            img['src'] = urljoin(clean_base_url, img['src'])
-                
-                # Smart Colors
-                found = data.get('colors', [])
-                if not any(len(c.get('hex_code', '')) > 1 for c in found): found.append({"hex_code": "#3B82F6"})
-                if not any(c.get('hex_code').upper() in ['#FFFFFF', '#FFF'] for c in found): found.insert(0, {"hex_code": "#FFFFFF"})
-                if not any(c.get('hex_code').upper() in ['#000000', '#000'] for c in found): found.append({"hex_code": "#000000"})
-                data['colors'] = found
-            return data
-        return None
-    except:
-        return None
-
-def generate_campaign_strategy(brand_data):
-    try:
-        model = old_genai.GenerativeModel('models/gemini-2.0-flash')
-        prompt = f"""
-        Act as a Luxury Brand Strategist. Brand: {json.dumps(brand_data)}
-        TASK: Create 3 high-end campaign concepts.
-        For each, write a 'final_constructed_prompt' for image generation.
-        IMPORTANT: The prompt MUST describe a CINEMATIC LANDSCAPE SHOT (16:9 aspect ratio).
-        
-        OUTPUT JSON: [{{ "campaign_name": "...", "campaign_description": "...", "image_prompt_structure": {{ "final_constructed_prompt": "..." }} }}]
-        """
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        return json.loads(response.text)
-    except:
-        return []
-
-def generate_video_strategy(brand_data):
-    try:
-        model = old_genai.GenerativeModel('models/gemini-2.0-flash')
-        prompt = f"""
-        Act as a Commercial Film Director. Brand: {json.dumps(brand_data)}
-        TASK: Create a concept for a high-end social media brand video.
-        Write a precise technical prompt for Veo 3.1.
-        REQUIREMENTS: Cinematic lighting, 4k, slow motion, drone shot or smooth dolly.
-        OUTPUT JSON: {{ "video_title": "...", "video_description": "...", "video_prompt": "Cinematic drone shot of..." }}
-        """
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        return json.loads(response.text)
-    except:
-        return {}
-
-def generate_social_prompts(brand_data):
-    try:
-        model = old_genai.GenerativeModel('models/gemini-2.0-flash')
-        prompt = f"""
-        Role: Art Director. Brand: {json.dumps(brand_data)}
-        TASK: Create 2 prompts for Nano Banana Pro.
-        GOAL: DIRECT SCREEN CAPTURE (UI Design). NO PHONES. NO HANDS.
-        FORMAT: Vertical 9:16.
-        1. Instagram Profile UI (Flat design, 8k).
-        2. TikTok Profile UI (Dark/Light mode, 8k).
-        OUTPUT JSON: {{ "instagram_final_prompt": "...", "tiktok_final_prompt": "..." }}
-        """
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        return json.loads(response.text)
-    except:
-        return {}
-
-def generate_image_from_prompt(prompt_text, aspect_ratio="16:9"):
-    try:
-        model = old_genai.GenerativeModel('models/nano-banana-pro-preview')
-        ar_prompt = " --aspect_ratio 16:9" if aspect_ratio == "16:9" else " --aspect_ratio 9:16"
-        refined = prompt_text + ar_prompt + " . 8k, photorealistic, high fidelity, highly detailed."
-        response = model.generate_content(refined)
-        if response.parts: return response.parts[0].inline_data.data
-        return None
-    except:
-        return None
-
-def generate_brand_video(prompt_text):
-    """
-    GENERATE VIDEO USING VEO 3.1 (NEW SDK)
-    """
-    try:
-        # Initialisation du client avec le NOUVEAU SDK
-        client = genai.Client(api_key=GOOGLE_API_KEY)
-        
-        # 1. Start Operation
-        operation = client.models.generate_videos(
-            model="veo-3.1-generate-preview",
-            prompt=prompt_text
-        )
-        
-        # 2. Polling Loop
-        while not operation.done:
-            time.sleep(5)
-            # Rafraîchir l'objet opération
-            operation = client.operations.get(operation)
-            
-        # 3. Retrieve Result
-        if operation.response and operation.response.generated_videos:
-            generated_video = operation.response.generated_videos[0]
-            
-            # Téléchargement des bytes directement
-            video_bytes = client.files.download(file=generated_video.video)
-            
-            return video_bytes
-            
-        return None
-        
-    except Exception as e:
-        print(f"Veo Error: {e}")
-        return None
+# --- UI HELPERS ---
+def render_media_image(handle):
+    # Served by URL from static/media (no bytes in session state or in the rerun payload)
+    # The browser picks a resized WebP/JPEG rendition; the original is only fetched for download
+    store = get_media_store()
+    url = store.url(handle) if handle else None
+    if not url: return
+    srcset = store.srcset(handle)
+    src = srcset.split(" ")[0] if srcset else url
+    st.markdown(
+        f"<img src='{src}' srcset='{srcset}' sizes='(max-width: 768px) 100vw, 50vw' class='generated-img'>"
+        f"<a href='{url}' download class='img-download'>Full resolution</a>",
+        unsafe_allow_html=True,
+    )
+
+def fill_image_slot(slot, handle):
+    if handle:
+        with slot: render_media_image(handle)
+    else: slot.empty()
+
+def render_video_slot(job_id):
+    job = get_video_jobs().get(job_id) if job_id else None
+    if job and job['video_path']:
+        # Published to static/media and played by URL: no MP4 bytes in Streamlit's media memory
+        store = get_media_store()
+        url = store.url(store.put_file(job['video_path'], f"{job_id}.mp4"))
+        st.markdown(f"<video src='{url}' class='generated-video' controls playsinline preload='metadata'></video>", unsafe_allow_html=True)
+    elif job and job['status'] in ('pending', 'running'):
+        slot_loader("RENDERING VIDEO (VEO 3.1)...")
+    else:
+        st.info("Video generation unavailable (API Limit or Safety Filter).")
+
+@st.fragment(run_every=VIDEO_POLL_SECONDS)
+def live_video_slot(job_id):
+    # Re-runs only this slot until the job ends, then one full rerun drops the timer
+    job = get_video_jobs().get(job_id)
+    if not job or job['status'] not in ('pending', 'running'):
+        st.rerun()
+    render_video_slot(job_id)
+
+def video_player(job_id):
+    job = get_video_jobs().get(job_id) if job_id else None
+    if job and job['status'] in ('pending', 'running'): live_video_slot(job_id)
+    else: render_video_slot(job_id)
+
+def render_campaign(i, c):
+    # Returns the image slot so that the image can land later
+    with st.container():
+        c1, c2 = st.columns([1, 1], gap="large", vertical_alignment="center")
+        with c1:
+            st.markdown(f"### {i+1}. {c.get('campaign_name')}")
+            st.write(c.get('campaign_description'))
+        with c2:
+            image_slot = st.empty()
+        st.markdown("---")
+    return image_slot
+
+def render_video_section(v):
+    st.markdown("<br><h2 style='text-align:center;'>Signature Video Campaign</h2>", unsafe_allow_html=True)
+    st.markdown("<p style='text-align:center; color:#6b7280; margin-bottom: 20px;'>High-End Social Media Commercial (Veo 3.1)</p>", unsafe_allow_html=True)
+
+    v1, v2 = st.columns([1, 1.5], gap="large", vertical_alignment="center")
+    with v1:
+        st.markdown(f"### {v.get('strategy', {}).get('video_title', 'Cinematic Vision')}")
+        st.write(v.get('strategy', {}).get('video_description', ''))
+        st.markdown("<br>", unsafe_allow_html=True)
+        with st.expander("Technical Video Prompt"):
+            st.code(v.get('strategy', {}).get('video_prompt'), language="text")
+    with v2:
+        video_player(v.get('job_id'))
+    st.markdown("---")
 
 def full_screen_loader(text):
     st.markdown(f"""<div class="custom-loader"><div class="loader-ring"></div><div class="loader-text">{text}</div></div>""", unsafe_allow_html=True)
+def slot_loader(text):
+    st.markdown(f"""<div class="slot-loader"><div class="loader-ring"></div><div class="loader-text">{text}</div></div>""", unsafe_allow_html=True)
 def render_chips(items, key_name='keyword'):
     if not items: return
     html = '<div class="chip-container">'
@@ -242,6 +178,27 @@ if 'campaigns' not in st.session_state: st.session_state.campaigns = []
 if 'social_images' not in st.session_state: st.session_state.social_images = {}
 if 'video_data' not in st.session_state: st.session_state.video_data = {}
 
+# Startup timing (?debug=1): imports + setup before the page renders.
+# First run of the process = cold start; later reruns should stay near zero.
+observe("app_rerun" if METRICS.has("app_cold_start") else "app_cold_start", time.perf_counter() - SCRIPT_START)
+
+# --- SIDEBAR (ops info, collapsed by default) ---
+# Ops gate: ?debug=1 shows the cache / pipeline panels and honours ?refresh=1
+# (paid re-extraction). With PROJECT_ONE_OPS_TOKEN set, ?debug=<token> is required.
+OPS_MODE = st.query_params.get("debug") == (os.environ.get("PROJECT_ONE_OPS_TOKEN") or "1")
+
+with st.sidebar:
+    if provider_mode() == "mock": st.caption("Mock providers (offline)")
+    if OPS_MODE:
+        for name, cs in cache_stats().items():
+            st.caption(f"Cache {name}: {cs['hits']} hits / {cs['misses']} misses ({cs['entries']} entries)")
+        with st.expander("Pipeline metrics", expanded=True):
+            summary = METRICS.summary()
+            if summary: st.dataframe([{"stage": k, **v} for k, v in summary.items()], hide_index=True)
+            else: st.caption("No upstream call recorded yet.")
+            st.caption(f"Single-flight: {FLIGHTS.shared} calls shared, {FLIGHTS.in_flight()} in flight")
+            st.download_button("Prometheus export", METRICS.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+
 # --- PAGE 1 ---
 if st.session_state.step == 1:
     show_header()
@@ -259,7 +216,7 @@ if st.session_state.step == 1:
             if url_input:
                 placeholder = st.empty()
                 with placeholder: full_screen_loader("DECODING BRAND DNA...")
-                data = get_brand_data(url_input)
+                data = get_brand_data(url_input, force_refresh=OPS_MODE and st.query_params.get("refresh") == "1")
                 placeholder.empty()
                 if data:
                     st.session_state.brand_data = data
@@ -322,83 +279,43 @@ elif st.session_state.step == 3:
     show_header()
     st.markdown("<div id='top'></div>", unsafe_allow_html=True)
     
-    if not st.session_state.campaigns or not st.session_state.social_images or not st.session_state.video_data:
-        placeholder = st.empty()
-        with placeholder: full_screen_loader("GENERATING VISUAL NARRATIVES & VIDEO CONCEPTS...")
-        
-        # 1. Campaigns (Landscape)
-        if not st.session_state.campaigns:
-            c_data = generate_campaign_strategy(st.session_state.brand_data)
-            final_c = []
-            for c in c_data:
-                prompt = c.get('image_prompt_structure', {}).get('final_constructed_prompt')
-                if prompt: 
-                    c['generated_image'] = generate_image_from_prompt(prompt, aspect_ratio="16:9")
-                final_c.append(c)
-            st.session_state.campaigns = final_c
-        
-        # 2. Social (Portrait)
-        if not st.session_state.social_images:
-            s_prompts = generate_social_prompts(st.session_state.brand_data)
-            if s_prompts.get('instagram_final_prompt'):
-                st.session_state.social_images['instagram'] = generate_image_from_prompt(s_prompts['instagram_final_prompt'], aspect_ratio="9:16")
-            if s_prompts.get('tiktok_final_prompt'):
-                st.session_state.social_images['tiktok'] = generate_image_from_prompt(s_prompts['tiktok_final_prompt'], aspect_ratio="9:16")
-        
-        # 3. Video (VEO 3.1 REAL)
-        if not st.session_state.video_data:
-            v_strat = generate_video_strategy(st.session_state.brand_data)
-            st.session_state.video_data['strategy'] = v_strat
-            if v_strat.get('video_prompt'):
-                # Call Real Veo Video
-                st.session_state.video_data['file_bytes'] = generate_brand_video(v_strat['video_prompt'])
-        
-        placeholder.empty()
-        st.rerun()
-
     st.markdown("<h1>Tailored Strategic Concepts</h1>", unsafe_allow_html=True)
     st.divider()
 
+    # Every section gets its own slot: cached results show immediately, missing
+    # ones show a per-slot loader and are filled in as soon as they are generated.
+    need_campaigns = not st.session_state.campaigns
+    need_social = not st.session_state.social_images
+    need_video = not st.session_state.video_data
+
     # Campaigns
-    for i, c in enumerate(st.session_state.campaigns):
-        with st.container():
-            c1, c2 = st.columns([1, 1], gap="large", vertical_alignment="center")
-            with c1:
-                st.markdown(f"### {i+1}. {c.get('campaign_name')}")
-                st.write(c.get('campaign_description'))
-            with c2:
-                if c.get('generated_image'): st.image(c['generated_image'], use_column_width=True)
-            st.markdown("---")
+    campaigns_box = st.empty()
+    image_slots = {}
+    if need_campaigns:
+        with campaigns_box: slot_loader("CRAFTING CAMPAIGN CONCEPTS...")
+    else:
+        with campaigns_box.container():
+            for i, c in enumerate(st.session_state.campaigns):
+                with render_campaign(i, c): render_media_image(c.get('image_ref'))
 
     # Video Section
-    if st.session_state.video_data:
-        v = st.session_state.video_data
-        st.markdown("<br><h2 style='text-align:center;'>Signature Video Campaign</h2>", unsafe_allow_html=True)
-        st.markdown("<p style='text-align:center; color:#6b7280; margin-bottom: 20px;'>High-End Social Media Commercial (Veo 3.1)</p>", unsafe_allow_html=True)
-        
-        v1, v2 = st.columns([1, 1.5], gap="large", vertical_alignment="center")
-        with v1:
-            st.markdown(f"### {v.get('strategy', {}).get('video_title', 'Cinematic Vision')}")
-            st.write(v.get('strategy', {}).get('video_description', ''))
-            st.markdown("<br>", unsafe_allow_html=True)
-            with st.expander("Technical Video Prompt"):
-                st.code(v.get('strategy', {}).get('video_prompt'), language="text")
-        with v2:
-            if v.get('file_bytes'):
-                st.video(v['file_bytes'], format="video/mp4")
-            else:
-                st.info("Video generation unavailable (API Limit or Safety Filter).")
-        st.markdown("---")
+    video_box = st.empty()
+    if need_video:
+        with video_box: slot_loader("DIRECTING VIDEO CONCEPT...")
+    else:
+        with video_box.container(): render_video_section(st.session_state.video_data)
 
     # Social Section
     st.markdown("<br><h2 style='text-align:center;'>Omnichannel Presence</h2>", unsafe_allow_html=True)
     s1, s2 = st.columns(2, gap="large")
-    with s1:
-        st.markdown("<h4 style='text-align:center;'>Instagram Preview</h4>", unsafe_allow_html=True)
-        if st.session_state.social_images.get('instagram'): st.image(st.session_state.social_images['instagram'], use_column_width=True)
-    with s2:
-        st.markdown("<h4 style='text-align:center;'>TikTok Preview</h4>", unsafe_allow_html=True)
-        if st.session_state.social_images.get('tiktok'): st.image(st.session_state.social_images['tiktok'], use_column_width=True)
+    social_slots = {}
+    for network, label, col in (('instagram', 'Instagram', s1), ('tiktok', 'TikTok', s2)):
+        with col:
+            st.markdown(f"<h4 style='text-align:center;'>{label} Preview</h4>", unsafe_allow_html=True)
+            social_slots[network] = st.empty()
+            with social_slots[network]:
+                if need_social: slot_loader("DESIGNING PROFILE MOCKUP...")
+                else: render_media_image(st.session_state.social_images.get(network))
 
     # Final CTA (Clean Text)
     st.markdown("<div style='height:80px;'></div>", unsafe_allow_html=True)
@@ -414,3 +331,33 @@ elif st.session_state.step == 3:
         st.link_button("Schedule a Consultation", "https://calendly.com/contact-respectfully/30min", use_container_width=True)
     
     st.markdown("<div style='height:50px;'></div>", unsafe_allow_html=True)
+
+    # Generation runs last so the whole page (CTA included) is already on screen
+    def on_result(kind, ref, value):
+        if kind == 'campaign_strategy':
+            with campaigns_box.container():
+                for i, c in enumerate(value):
+                    image_slots[id(c)] = render_campaign(i, c)
+                    if c.get('image_prompt_structure', {}).get('final_constructed_prompt'):
+                        with image_slots[id(c)]: slot_loader("RENDERING VISUAL...")
+        elif kind == 'campaign_image':
+            fill_image_slot(image_slots[id(ref)], value)
+        elif kind == 'social_prompts':
+            for network, slot in social_slots.items():
+                if network not in value: slot.empty()
+        elif kind == 'social_image':
+            fill_image_slot(social_slots[ref], value)
+        elif kind == 'video_strategy':
+            with video_box.container(): render_video_section(value)
+
+    if need_campaigns or need_social or need_video:
+        campaigns, social_images, video_data = run_step3_generation(
+            st.session_state.brand_data,
+            need_campaigns=need_campaigns,
+            need_social=need_social,
+            need_video=need_video,
+            on_result=on_result,
+        )
+        if need_campaigns: st.session_state.campaigns = campaigns
+        if need_social: st.session_state.social_images = social_images
+        if need_video: st.session_state.video_data = video_data
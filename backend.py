@@ -0,0 +1,451 @@
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, urljoin
+
+from cache import get_cache, memoize, stable_hash, normalize_domain
+from video_jobs import get_job_manager
+# Google SDKs (ancien pour Texte/Images, nouveau pour Veo): chargés à la demande dans clients.py
+from clients import get_http_session, get_generative_model, get_genai_client, provider_mode
+from media_store import get_media_store
+from ratelimit import call
+from extraction import fetch_static_brand, is_public_url
+from metrics import track
+from singleflight import FLIGHTS
+
+# --- BACKEND (no Streamlit here: shared by app.py and batch.py) ---
+SCRAPINGBEE_API_KEY = None
+GOOGLE_API_KEY = None
+
+def configure(scrapingbee_api_key, google_api_key):
+    """Store the keys. Cheap: the SDKs are imported / configured by their first call (clients.py)."""
+    global SCRAPINGBEE_API_KEY, GOOGLE_API_KEY
+    SCRAPINGBEE_API_KEY = scrapingbee_api_key
+    GOOGLE_API_KEY = google_api_key
+
+def is_configured():
+    return SCRAPINGBEE_API_KEY is not None
+
+# Step 3: 3 text strategies + 5 images can run at the same time (Veo runs in video_jobs)
+MAX_GENERATION_WORKERS = 8
+
+# Brand extraction cache (ScrapingBee is paid per call)
+BRAND_CACHE_TTL = 7 * 24 * 3600
+BRAND_CACHE_MAX_ENTRIES = 500
+SCRAPINGBEE_TIMEOUT = 90  # seconds; a timeout is retried by the scheduler
+
+# Tiered extraction: static fetch -> AI on raw HTML -> AI on rendered page (only if needed)
+EXTRACTION_VERSION = 3
+REQUIRED_BRAND_FIELDS = ("projectName", "industry", "concept", "colors")
+RENDER_WAIT_MS = 1500
+RENDER_WAIT_MS_APP_SHELL = 3000  # JS app shell: content only exists after hydration
+
+def get_brand_cache():
+    return get_cache("brand_data", ttl=BRAND_CACHE_TTL, max_entries=BRAND_CACHE_MAX_ENTRIES)
+
+# Models + prompt template versions (bump a version when its prompt changes -> old cache entries are ignored)
+TEXT_MODEL = 'models/gemini-2.0-flash'
+IMAGE_MODEL = 'models/nano-banana-pro-preview'
+PROMPT_VERSIONS = {"campaign": 2, "video": 2, "social": 2, "bundle": 2, "image": 1}
+GENERATION_CACHE = {"ttl": 30 * 24 * 3600, "max_entries": 5000}
+IMAGE_CACHE = {"ttl": 30 * 24 * 3600, "max_entries": 2000}
+
+BRAND_EXTRACT_RULES = {
+    "projectName": "The official name of the company.",
+    "tagline": "The main slogan found in the hero section.",
+    "industry": "The specific industry sector.",
+    "concept": "A 50-word summary of what the business does.",
+    "colors": {"description": "list of 5 brand colors", "type": "list", "output": {"hex_code": "Hex code"}},
+    "fonts": {"description": "List of 2 font families", "type": "list", "output": {"font_name": "Name", "use": "Use"}},
+    "aesthetic": {"description": "4 adjectives for visual style", "type": "list", "output": {"keyword": "Adjective"}},
+    "values": {"description": "4 brand values", "type": "list", "output": {"value": "Value"}},
+    "tone": {"description": "4 tone keywords", "type": "list", "output": {"keyword": "Tone"}},
+    "images": {"description": "4 distinct image URLs", "type": "list", "output": {"src": "URL", "alt": "Alt"}}
+}
+
+def scrapingbee_extract(target_url, rules, render=False, wait_ms=None):
+    """
+    One ScrapingBee AI extraction. render=False reads the raw HTML (no browser:
+    cheapest, no wait); render=True runs JS with images/CSS blocked and a short wait.
+    """
+    params = {
+        "api_key": SCRAPINGBEE_API_KEY,
+        "url": target_url,
+        "render_js": "false",
+        "ai_extract_rules": json.dumps(rules)
+    }
+    if render:
+        params.update({"render_js": "true", "block_resources": "true", "wait_browser": "domcontentloaded", "wait": str(wait_ms or RENDER_WAIT_MS)})
+
+    with track("scrapingbee_render" if render else "scrapingbee_extract") as t:
+        try:
+            response = call("scrapingbee", get_http_session().get, "https://app.scrapingbee.com/api/v1", params=params, timeout=SCRAPINGBEE_TIMEOUT, tracker=t)
+            t.received(response.content)
+            if response.status_code != 200:
+                t.fail(f"HTTP {response.status_code}")
+                return None
+            data = response.json()
+            # Only a JSON object can be merged (error pages may come back as a list / string)
+            if not isinstance(data, dict) or not data:
+                t.empty()
+                return None
+            return data
+        except Exception as e:
+            t.fail(e)
+            return None
+
+def _merge_missing(data, extracted):
+    if not isinstance(extracted, dict): return
+    for key, value in extracted.items():
+        if value and not data.get(key): data[key] = value
+
+# List fields whose entries must carry this key (ScrapingBee often returns nulls)
+LIST_ENTRY_KEYS = {"colors": "hex_code", "images": "src", "fonts": "font_name"}
+
+def _clean_lists(data):
+    for field, key in LIST_ENTRY_KEYS.items():
+        if field not in data: continue
+        entries = data[field] if isinstance(data[field], list) else []
+        data[field] = [e for e in entries if isinstance(e, dict) and isinstance(e.get(key), str) and e[key].strip()]
+
+def _missing_fields(data):
+    return [k for k in BRAND_EXTRACT_RULES if not data.get(k)]
+
+def get_brand_data(url, force_refresh=False):
+    cache = get_brand_cache()
+    cache_key = f"{normalize_domain(url)}:{stable_hash([BRAND_EXTRACT_RULES, EXTRACTION_VERSION])}"
+    if not force_refresh:
+        cached = cache.get(cache_key)
+        if cached: return cached
+    # Sessions analysing the same domain at the same time share one extraction
+    return FLIGHTS.do(f"brand:{cache_key}", _extract_brand_data, url, cache_key, recheck=None if force_refresh else lambda: cache.get(cache_key))
+
+def _extract_brand_data(url, cache_key):
+    target_url = url if url.startswith("http") else f"https://{url}"
+    parsed_uri = urlparse(target_url)
+    clean_domain = parsed_uri.netloc
+    if clean_domain.startswith("www."): clean_domain = clean_domain[4:]
+    clean_base_url = f"{parsed_uri.scheme}://{clean_domain}"
+    google_favicon_url = f"https://www.google.com/s2/favicons?domain={clean_domain}&sz=128"
+
+    # Tier 1: plain fetch + local parsing (title, meta, og:image, CSS colors, fonts)
+    with track("site_fetch") as t:
+        try:
+            # Stub sites (mock providers) have no DNS: only live fetches are vetted
+            allow_url = None if provider_mode() == "mock" else is_public_url
+            data, is_thin = fetch_static_brand(lambda *a, **kw: call("site", get_http_session().get, *a, tracker=t, **kw), target_url, allow_url=allow_url)
+            if not data: t.empty()
+        except Exception as e:
+            t.fail(e)
+            data, is_thin = {}, True
+
+    # Tier 2: AI extraction on the raw HTML, only for the fields still missing
+    missing = _missing_fields(data)
+    if missing and not is_thin:
+        _merge_missing(data, scrapingbee_extract(target_url, {k: BRAND_EXTRACT_RULES[k] for k in missing}))
+
+    # Tier 3: rendered page, for JS app shells or when required fields are still missing
+    missing = _missing_fields(data)
+    if missing and (is_thin or any(k in missing for k in REQUIRED_BRAND_FIELDS)):
+        wait_ms = RENDER_WAIT_MS_APP_SHELL if is_thin else RENDER_WAIT_MS
+        _merge_missing(data, scrapingbee_extract(target_url, {k: BRAND_EXTRACT_RULES[k] for k in missing}, render=True, wait_ms=wait_ms))
+
+    if not data: return None
+    try:
+        _clean_lists(data)
+        data['logo'] = google_favicon_url
+        if data.get('images'):
+            for img in data['images']:
+                if not img['src'].startswith('data:'):
+                    img['src'] = urljoin(clean_base_url, img['src'])
+
+        # Smart Colors
+        found = data.get('colors', [])
+        if not any(len(c['hex_code']) > 1 for c in found): found.append({"hex_code": "#3B82F6"})
+        if not any(c['hex_code'].upper() in ['#FFFFFF', '#FFF'] for c in found): found.insert(0, {"hex_code": "#FFFFFF"})
+        if not any(c['hex_code'].upper() in ['#000000', '#000'] for c in found): found.append({"hex_code": "#000000"})
+        data['colors'] = found
+    except Exception as e:
+        print(f"Brand extraction error: {e}")
+        return None
+
+    # Partial results are shown but not cached, so the next analysis tries again
+    if not any(k in _missing_fields(data) for k in REQUIRED_BRAND_FIELDS): get_brand_cache().set(cache_key, data)
+    return data
+
+# Brand fields each strategy section actually uses (logo, image URLs... only cost input tokens)
+SECTION_BRAND_FIELDS = {
+    "campaign": ("projectName", "tagline", "industry", "concept", "colors", "aesthetic", "values", "tone"),
+    "video": ("projectName", "tagline", "industry", "concept", "colors", "aesthetic", "tone"),
+    "social": ("projectName", "tagline", "industry", "concept", "colors", "fonts", "aesthetic", "tone"),
+}
+
+def brand_payload(brand_data, *sections):
+    """Compact JSON of the brand fields used by the given sections ([{'value': 'x'}] -> ['x'])."""
+    fields = [f for f in BRAND_EXTRACT_RULES if any(f in SECTION_BRAND_FIELDS[s] for s in sections)]
+    payload = {}
+    for field in fields:
+        value = brand_data.get(field)
+        if isinstance(value, list):
+            value = [next(iter(v.values()), None) if isinstance(v, dict) and len(v) == 1 else v for v in value]
+            value = [v for v in value if v]
+        if value: payload[field] = value
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+def _valid_campaigns(value):
+    return isinstance(value, list) and bool(value) and all(
+        isinstance(c, dict) and c.get('campaign_name') and isinstance(c.get('image_prompt_structure'), dict)
+        and c['image_prompt_structure'].get('final_constructed_prompt') for c in value)
+
+def _valid_video(value):
+    return isinstance(value, dict) and bool(value.get('video_prompt'))
+
+def _valid_social(value):
+    return isinstance(value, dict) and bool(value.get('instagram_final_prompt')) and bool(value.get('tiktok_final_prompt'))
+
+# section -> (task for the combined prompt, JSON schema, validator)
+_STR = {"type": "STRING"}
+STRATEGY_SECTIONS = {
+    "campaign": (
+        """"campaign": Act as a Luxury Brand Strategist. Create 3 high-end campaign concepts.
+        For each, write a 'final_constructed_prompt' for image generation.
+        IMPORTANT: The prompt MUST describe a CINEMATIC LANDSCAPE SHOT (16:9 aspect ratio).""",
+        {"type": "ARRAY", "items": {"type": "OBJECT", "properties": {
+            "campaign_name": _STR, "campaign_description": _STR,
+            "image_prompt_structure": {"type": "OBJECT", "properties": {"final_constructed_prompt": _STR}, "required": ["final_constructed_prompt"]},
+        }, "required": ["campaign_name", "campaign_description", "image_prompt_structure"]}},
+        _valid_campaigns,
+    ),
+    "video": (
+        """"video": Act as a Commercial Film Director. Create a concept for a high-end social media brand video.
+        Write a precise technical prompt for Veo 3.1 ('video_prompt').
+        REQUIREMENTS: Cinematic lighting, 4k, slow motion, drone shot or smooth dolly.""",
+        {"type": "OBJECT", "properties": {"video_title": _STR, "video_description": _STR, "video_prompt": _STR},
+         "required": ["video_title", "video_description", "video_prompt"]},
+        _valid_video,
+    ),
+    "social": (
+        """"social": Role: Art Director. Create 2 prompts for Nano Banana Pro.
+        GOAL: DIRECT SCREEN CAPTURE (UI Design). NO PHONES. NO HANDS.
+        FORMAT: Vertical 9:16.
+        1. 'instagram_final_prompt': Instagram Profile UI (Flat design, 8k).
+        2. 'tiktok_final_prompt': TikTok Profile UI (Dark/Light mode, 8k).""",
+        {"type": "OBJECT", "properties": {"instagram_final_prompt": _STR, "tiktok_final_prompt": _STR},
+         "required": ["instagram_final_prompt", "tiktok_final_prompt"]},
+        _valid_social,
+    ),
+}
+
+@memoize("strategies", f"bundle:{TEXT_MODEL}:v{PROMPT_VERSIONS['bundle']}", **GENERATION_CACHE)
+def generate_strategy_bundle(brand_data, sections=("campaign", "video", "social")):
+    """
+    ONE Gemini call for several strategy sections (schema-constrained JSON).
+    Returns {section: value} with only the sections that passed validation;
+    the caller falls back to the per-section generators for the others.
+    """
+    with track("gemini_bundle") as t:
+        try:
+            model = get_generative_model(TEXT_MODEL, GOOGLE_API_KEY)
+            tasks = "\n        ".join(STRATEGY_SECTIONS[s][0] for s in sections)
+            prompt = f"""
+            Brand: {brand_payload(brand_data, *sections)}
+            Answer each TASK under its own key of one JSON object.
+            {tasks}
+            """
+            schema = {"type": "OBJECT", "properties": {s: STRATEGY_SECTIONS[s][1] for s in sections}, "required": list(sections)}
+            t.sent(prompt)
+            response = call("gemini", model.generate_content, prompt, generation_config={"response_mime_type": "application/json", "response_schema": schema}, tracker=t)
+            t.usage(response)
+            t.received(response.text)
+            result = json.loads(response.text)
+            valid = {s: result[s] for s in sections if isinstance(result, dict) and STRATEGY_SECTIONS[s][2](result.get(s))}
+            if len(valid) < len(sections): t.empty()
+            return valid
+        except Exception as e:
+            t.fail(e)
+            return {}
+
+@memoize("strategies", f"campaign:{TEXT_MODEL}:v{PROMPT_VERSIONS['campaign']}", valid=_valid_campaigns, **GENERATION_CACHE)
+def generate_campaign_strategy(brand_data):
+    with track("gemini_campaign") as t:
+        try:
+            model = get_generative_model(TEXT_MODEL, GOOGLE_API_KEY)
+            prompt = f"""
+            Act as a Luxury Brand Strategist. Brand: {brand_payload(brand_data, 'campaign')}
+            TASK: Create 3 high-end campaign concepts.
+            For each, write a 'final_constructed_prompt' for image generation.
+            IMPORTANT: The prompt MUST describe a CINEMATIC LANDSCAPE SHOT (16:9 aspect ratio).
+        
+            OUTPUT JSON: [{{ "campaign_name": "...", "campaign_description": "...", "image_prompt_structure": {{ "final_constructed_prompt": "..." }} }}]
+            """
+            t.sent(prompt)
+            response = call("gemini", model.generate_content, prompt, generation_config={"response_mime_type": "application/json"}, tracker=t)
+            t.usage(response)
+            t.received(response.text)
+            return json.loads(response.text)
+        except Exception as e:
+            t.fail(e)
+            return []
+
+@memoize("strategies", f"video:{TEXT_MODEL}:v{PROMPT_VERSIONS['video']}", valid=_valid_video, **GENERATION_CACHE)
+def generate_video_strategy(brand_data):
+    with track("gemini_video") as t:
+        try:
+            model = get_generative_model(TEXT_MODEL, GOOGLE_API_KEY)
+            prompt = f"""
+            Act as a Commercial Film Director. Brand: {brand_payload(brand_data, 'video')}
+            TASK: Create a concept for a high-end social media brand video.
+            Write a precise technical prompt for Veo 3.1.
+            REQUIREMENTS: Cinematic lighting, 4k, slow motion, drone shot or smooth dolly.
+            OUTPUT JSON: {{ "video_title": "...", "video_description": "...", "video_prompt": "Cinematic drone shot of..." }}
+            """
+            t.sent(prompt)
+            response = call("gemini", model.generate_content, prompt, generation_config={"response_mime_type": "application/json"}, tracker=t)
+            t.usage(response)
+            t.received(response.text)
+            return json.loads(response.text)
+        except Exception as e:
+            t.fail(e)
+            return {}
+
+@memoize("strategies", f"social:{TEXT_MODEL}:v{PROMPT_VERSIONS['social']}", valid=_valid_social, **GENERATION_CACHE)
+def generate_social_prompts(brand_data):
+    with track("gemini_social") as t:
+        try:
+            model = get_generative_model(TEXT_MODEL, GOOGLE_API_KEY)
+            prompt = f"""
+            Role: Art Director. Brand: {brand_payload(brand_data, 'social')}
+            TASK: Create 2 prompts for Nano Banana Pro.
+            GOAL: DIRECT SCREEN CAPTURE (UI Design). NO PHONES. NO HANDS.
+            FORMAT: Vertical 9:16.
+            1. Instagram Profile UI (Flat design, 8k).
+            2. TikTok Profile UI (Dark/Light mode, 8k).
+            OUTPUT JSON: {{ "instagram_final_prompt": "...", "tiktok_final_prompt": "..." }}
+            """
+            t.sent(prompt)
+            response = call("gemini", model.generate_content, prompt, generation_config={"response_mime_type": "application/json"}, tracker=t)
+            t.usage(response)
+            t.received(response.text)
+            return json.loads(response.text)
+        except Exception as e:
+            t.fail(e)
+            return {}
+
+@memoize("images", f"image:{IMAGE_MODEL}:v{PROMPT_VERSIONS['image']}", blob=True, **IMAGE_CACHE)
+def generate_image_from_prompt(prompt_text, aspect_ratio="16:9"):
+    with track("nano_banana_image") as t:
+        try:
+            model = get_generative_model(IMAGE_MODEL, GOOGLE_API_KEY)
+            ar_prompt = " --aspect_ratio 16:9" if aspect_ratio == "16:9" else " --aspect_ratio 9:16"
+            refined = prompt_text + ar_prompt + " . 8k, photorealistic, high fidelity, highly detailed."
+            t.sent(refined)
+            response = call("nano_banana", model.generate_content, refined, tracker=t)
+            t.usage(response)
+            if response.parts:
+                t.received(response.parts[0].inline_data.data)
+                return response.parts[0].inline_data.data
+            t.empty()
+            return None
+        except Exception as e:
+            t.fail(e)
+            return None
+
+def generate_image_media(prompt_text, aspect_ratio="16:9"):
+    """Image -> media store handle. Runs in a worker: decoding / resizing stays off the main loop."""
+    return get_media_store().put(generate_image_from_prompt(prompt_text, aspect_ratio=aspect_ratio))
+
+def get_video_jobs():
+    # Client du NOUVEAU SDK partagé par tout le process
+    return get_job_manager(lambda: get_genai_client(GOOGLE_API_KEY))
+
+def generate_brand_video(prompt_text):
+    """
+    GENERATE VIDEO USING VEO 3.1 (NEW SDK)
+    Blocking helper: the page itself submits the job and renders while it runs.
+    """
+    jobs = get_video_jobs()
+    path = jobs.wait(jobs.submit(prompt_text))
+    if path:
+        with open(path, "rb") as f: return f.read()
+    return None
+
+SECTION_FALLBACKS = {
+    "campaign": ('campaign_strategy', generate_campaign_strategy),
+    "video": ('video_strategy', generate_video_strategy),
+    "social": ('social_prompts', generate_social_prompts),
+}
+
+SECTION_VALIDATORS = {kind: STRATEGY_SECTIONS[s][2] for s, (kind, _) in SECTION_FALLBACKS.items()}
+
+def run_step3_generation(brand_data, need_campaigns=True, need_social=True, need_video=True, on_result=None):
+    """
+    CONCURRENT STEP-3 ORCHESTRATION
+    The text strategies come from one combined call (per-section calls run in
+    parallel only for sections it failed); each image job is submitted as soon
+    as its prompt is ready, so wall-clock time follows the slowest branch.
+    The Veo render is only queued (video_data['job_id']) and finishes in the background.
+    Images go to the media store (with their display renditions): the returned
+    dicts only hold handles, never bytes.
+    on_result(kind, ref, value) is called as each piece lands, to render it right away.
+    Results are collected and on_result is called in the caller's thread only
+    (workers never touch st.session_state).
+    """
+    campaigns, social_images, video_data = [], {}, {}
+    with ThreadPoolExecutor(max_workers=MAX_GENERATION_WORKERS) as pool:
+        pending = {}
+
+        def handle(kind, ref, result):
+            # 1. Campaigns (Landscape)
+            if kind == 'campaign_strategy':
+                for c in result or []:
+                    campaigns.append(c)
+                    prompt = c.get('image_prompt_structure', {}).get('final_constructed_prompt')
+                    if prompt:
+                        pending[pool.submit(generate_image_media, prompt, aspect_ratio="16:9")] = ('campaign_image', c)
+                result = campaigns
+            elif kind == 'campaign_image':
+                ref['image_ref'] = result
+
+            # 2. Social (Portrait)
+            elif kind == 'social_prompts':
+                s_prompts = result or {}
+                result = [n for n in ('instagram', 'tiktok') if s_prompts.get(f'{n}_final_prompt')]
+                for network in result:
+                    pending[pool.submit(generate_image_media, s_prompts[f'{network}_final_prompt'], aspect_ratio="9:16")] = ('social_image', network)
+            elif kind == 'social_image':
+                social_images[ref] = result
+
+            # 3. Video (VEO 3.1 REAL)
+            elif kind == 'video_strategy':
+                v_strat = result or {}
+                video_data['strategy'] = v_strat
+                if v_strat.get('video_prompt'):
+                    video_data['job_id'] = get_video_jobs().submit(v_strat['video_prompt'])
+                result = video_data
+
+            if on_result: on_result(kind, ref, result)
+
+        # 0. One combined strategy call; sections that fail validation fall back to their own call
+        sections = [s for s, needed in (("campaign", need_campaigns), ("video", need_video), ("social", need_social)) if needed]
+        if sections: pending[pool.submit(generate_strategy_bundle, brand_data, sections)] = ('strategy_bundle', sections)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, ref = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Step 3 Error ({kind}): {e}")
+                    result = None
+
+                if kind == 'strategy_bundle':
+                    for section in ref:
+                        section_kind, fallback = SECTION_FALLBACKS[section]
+                        if section in (result or {}): handle(section_kind, None, result[section])
+                        else: pending[pool.submit(fallback, brand_data)] = (section_kind, None)
+                else:
+                    # A fallback answer with the wrong shape counts as no answer
+                    if kind in SECTION_VALIDATORS and not SECTION_VALIDATORS[kind](result): result = None
+                    handle(kind, ref, result)
+
+    return campaigns, social_images, video_data
@@ -0,0 +1,147 @@
+"""
+HEADLESS BATCH RUNNER
+Pre-generate brand packs for a list of domains, without Streamlit.
+
+    python batch.py domains.txt --out packs/ --concurrency 8 --gemini-rpm 60
+
+domains.txt: one URL / domain per line ('#' comments allowed).
+Each domain gets packs/<domain>/ with brand.json, strategy.json, the images,
+video.mp4 and result.json. result.json is written last: a domain that has it
+is skipped on the next run, so a crashed batch resumes where it stopped.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tomllib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import backend
+from cache import normalize_domain
+from media_store import get_media_store
+from metrics import REGISTRY as METRICS
+from ratelimit import set_rate_limit
+
+SECRETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+
+def load_api_keys():
+    """Environment first, then the Streamlit secrets file used by app.py."""
+    secrets = {}
+    if os.path.exists(SECRETS_FILE):
+        with open(SECRETS_FILE, "rb") as f: secrets = tomllib.load(f)
+    keys = {name: os.environ.get(name) or secrets.get(name) for name in ("SCRAPINGBEE_API_KEY", "GOOGLE_API_KEY")}
+    missing = [name for name, value in keys.items() if not value]
+    if missing: sys.exit(f"System Configuration Error: API Keys missing ({', '.join(missing)}).")
+    return keys["SCRAPINGBEE_API_KEY"], keys["GOOGLE_API_KEY"]
+
+
+def read_domains(path):
+    with open(path, encoding="utf-8") as f:
+        lines = [line.split("#", 1)[0].strip() for line in f]
+    seen, urls = set(), []
+    for url in lines:
+        if url and normalize_domain(url) not in seen:
+            seen.add(normalize_domain(url))
+            urls.append(url)
+    return urls
+
+
+def write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def copy_media(handle, dest_dir, name):
+    path = get_media_store().path_for(handle) if handle else None
+    if not path: return None
+    filename = name + os.path.splitext(handle)[1]
+    shutil.copyfile(path, os.path.join(dest_dir, filename))
+    return filename
+
+
+def run_domain(url, out_dir, with_video=True, video_timeout=900, force_refresh=False):
+    domain = normalize_domain(url)
+    dest = os.path.join(out_dir, domain)
+    if os.path.exists(os.path.join(dest, "result.json")): return domain, "skipped"
+    os.makedirs(dest, exist_ok=True)
+
+    brand_data = backend.get_brand_data(url, force_refresh=force_refresh)
+    if not brand_data: return domain, "failed: brand extraction"
+    write_json(os.path.join(dest, "brand.json"), brand_data)
+
+    campaigns, social_images, video_data = backend.run_step3_generation(brand_data, need_video=with_video)
+    result = {"url": url, "domain": domain, "campaigns": [], "social": {}, "video": None}
+    for i, c in enumerate(campaigns):
+        campaign = {k: v for k, v in c.items() if k != "image_ref"}
+        campaign["image"] = copy_media(c.get("image_ref"), dest, f"campaign_{i+1}")
+        result["campaigns"].append(campaign)
+    for network, handle in social_images.items():
+        result["social"][network] = copy_media(handle, dest, network)
+    if video_data:
+        result["video"] = {"strategy": video_data.get("strategy", {}), "file": None}
+        if video_data.get("job_id"):
+            path = backend.get_video_jobs().wait(video_data["job_id"], timeout=video_timeout)
+            if path:
+                shutil.copyfile(path, os.path.join(dest, "video.mp4"))
+                result["video"]["file"] = "video.mp4"
+
+    write_json(os.path.join(dest, "strategy.json"), {k: result[k] for k in ("campaigns", "social", "video")})
+    write_json(os.path.join(dest, "result.json"), result)
+    return domain, "ok"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate brand packs for many domains offline.")
+    parser.add_argument("input", help="text file with one URL / domain per line")
+    parser.add_argument("--out", default="brand_packs", help="output directory (default: brand_packs)")
+    parser.add_argument("--concurrency", type=int, default=4, help="domains processed at the same time")
+    parser.add_argument("--scrapingbee-rpm", type=float, default=30, help="ScrapingBee requests per minute")
+    parser.add_argument("--gemini-rpm", type=float, default=60, help="Gemini text requests per minute")
+    parser.add_argument("--image-rpm", type=float, default=20, help="Nano Banana requests per minute")
+    parser.add_argument("--veo-rpm", type=float, default=2, help="Veo submissions per minute")
+    parser.add_argument("--no-video", action="store_true", help="skip the Veo video")
+    parser.add_argument("--video-timeout", type=int, default=900, help="seconds to wait for each video")
+    parser.add_argument("--force-refresh", action="store_true", help="ignore the brand extraction cache")
+    parser.add_argument("--metrics-jsonl", help="append one JSON line per upstream call to this file")
+    args = parser.parse_args(argv)
+
+    backend.configure(*load_api_keys())
+    set_rate_limit("scrapingbee", args.scrapingbee_rpm)
+    set_rate_limit("gemini", args.gemini_rpm)
+    set_rate_limit("nano_banana", args.image_rpm)
+    set_rate_limit("veo_submit", args.veo_rpm)
+
+    if args.metrics_jsonl: METRICS.jsonl_path = args.metrics_jsonl
+
+    urls = read_domains(args.input)
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, "manifest.jsonl")
+    counts = {}
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool, open(manifest_path, "a", encoding="utf-8") as manifest:
+        futures = {
+            pool.submit(run_domain, url, args.out, not args.no_video, args.video_timeout, args.force_refresh): url
+            for url in urls
+        }
+        for n, future in enumerate(as_completed(futures), 1):
+            url = futures[future]
+            try:
+                domain, status = future.result()
+            except Exception as e:
+                domain, status = normalize_domain(url), f"failed: {e}"
+            counts[status.split(":")[0]] = counts.get(status.split(":")[0], 0) + 1
+            if status != "skipped":
+                manifest.write(json.dumps({"domain": domain, "status": status}) + "\n")
+                manifest.flush()
+            print(f"[{n}/{len(urls)}] {domain}: {status}", flush=True)
+
+    print(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+    # Per-stage latency / errors / tokens for the whole run
+    with open(os.path.join(args.out, "metrics.prom"), "w", encoding="utf-8") as f: f.write(METRICS.to_prometheus())
+    return 0 if not counts.get("failed") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
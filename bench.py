@@ -0,0 +1,155 @@
+"""
+OFFLINE BENCHMARK
+Drive the full step 1 -> 3 flow (brand extraction, strategies, images, Veo job)
+for N concurrent sessions against the local stub providers (mock_providers.py):
+no API keys, no network, so latency / throughput / memory regressions show up
+on any machine.
+
+    python bench.py --sessions 40 --concurrency 8 --domains 10 --latency-scale 0.1
+
+--domains < --sessions makes sessions share domains (cache + single-flight).
+Caches and media go to a fresh temporary directory unless --cache-dir is given.
+--json writes the report, to compare two runs.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows: no ru_maxrss
+    resource = None
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3) if values else None
+
+
+def run_session(backend, url, wait_video, video_timeout):
+    """One user: analyse the URL, then generate everything. Returns {phase: seconds}."""
+    timings = {}
+    start = time.perf_counter()
+    brand_data = backend.get_brand_data(url)
+    timings["step1_brand"] = time.perf_counter() - start
+    if not brand_data: raise RuntimeError("brand extraction failed")
+
+    step3 = time.perf_counter()
+    first = []
+
+    def on_result(kind, ref, value):
+        if not first and kind in ("campaign_image", "social_image") and value: first.append(time.perf_counter() - step3)
+
+    campaigns, social_images, video_data = backend.run_step3_generation(brand_data, on_result=on_result)
+    timings["step3_first_image"] = first[0] if first else None
+    timings["step3_total"] = time.perf_counter() - step3
+    timings["images"] = sum(1 for c in campaigns if c.get("image_ref")) + len([h for h in social_images.values() if h])
+
+    if wait_video and video_data.get("job_id"):
+        path = backend.get_video_jobs().wait(video_data["job_id"], timeout=video_timeout)
+        timings["video_ready"] = time.perf_counter() - step3 if path else None
+    timings["session_total"] = time.perf_counter() - start
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline with stub providers.")
+    parser.add_argument("--sessions", type=int, default=20, help="number of simulated sessions")
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions running at the same time")
+    parser.add_argument("--domains", type=int, default=None, help="distinct domains (default: one per session)")
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="multiplier on the simulated upstream latencies")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of upstream calls failing with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.02, help="share of upstream calls failing with 429")
+    parser.add_argument("--thin-rate", type=float, default=0.2, help="share of sites served as JS app shells")
+    parser.add_argument("--image-kb", type=int, default=1500, help="size of each generated image")
+    parser.add_argument("--wait-video", action="store_true", help="also wait for the Veo render of each session")
+    parser.add_argument("--video-timeout", type=int, default=300, help="seconds to wait for each video")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the simulated latencies / failures")
+    parser.add_argument("--cache-dir", help="cache directory (default: a fresh temporary directory)")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    # Cache / media locations are read at import time: set them before importing the pipeline
+    work_dir = args.cache_dir or tempfile.mkdtemp(prefix="project-one-bench-")
+    os.environ["PROJECT_ONE_CACHE_DIR"] = work_dir
+    os.environ["PROJECT_ONE_MEDIA_DIR"] = os.path.join(work_dir, "media")
+
+    import backend
+    from clients import use_providers
+    from metrics import REGISTRY as METRICS
+    from mock_providers import MockProfile
+    from singleflight import FLIGHTS
+
+    use_providers("mock", MockProfile(
+        scale=args.latency_scale, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        thin_rate=args.thin_rate, image_kb=args.image_kb, seed=args.seed,
+    ))
+    backend.configure("mock", "mock")
+
+    domains = args.domains or args.sessions
+    urls = [f"https://brand-{i % domains}.example" for i in range(args.sessions)]
+    print(f"{args.sessions} sessions, concurrency {args.concurrency}, {domains} domains, cache {work_dir}", flush=True)
+
+    tracemalloc.start()
+    results, failures = [], []
+    lock = threading.Lock()
+
+    def session(url):
+        try:
+            timings = run_session(backend, url, args.wait_video, args.video_timeout)
+            with lock: results.append(timings)
+        except Exception as e:
+            with lock: failures.append(f"{url}: {e}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(session, urls))
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    phases = ("step1_brand", "step3_first_image", "step3_total", "video_ready", "session_total")
+    report = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "domains": domains,
+        "latency_scale": args.latency_scale,
+        "failed": len(failures),
+        "wall_s": round(wall, 3),
+        "throughput_sessions_per_s": round(len(results) / wall, 3) if wall else None,
+        "images": sum(r["images"] for r in results),
+        "latency_s": {},
+        "peak_python_mb": round(peak / 2**20, 1),
+        # ru_maxrss is in KB on Linux, bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10), 1) if resource else None,
+        "singleflight_shared": FLIGHTS.shared,
+        "stages": METRICS.summary(),
+    }
+    for phase in phases:
+        values = [r[phase] for r in results if r.get(phase) is not None]
+        if values: report["latency_s"][phase] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "max": round(max(values), 3)}
+
+    print(f"\n{len(results)} ok, {len(failures)} failed in {report['wall_s']}s -> {report['throughput_sessions_per_s']} sessions/s")
+    for failure in failures[:5]: print(f"  failed {failure}")
+    print(f"{'phase':<20}{'p50':>9}{'p95':>9}{'max':>9}")
+    for phase, v in report["latency_s"].items():
+        print(f"{phase:<20}{v['p50']:>9}{v['p95']:>9}{v['max']:>9}")
+    print(f"peak memory: {report['peak_python_mb']} MB Python heap, {report['peak_rss_mb']} MB RSS")
+    print(f"single-flight: {report['singleflight_shared']} calls shared")
+    print(f"\n{'stage':<22}{'calls':>7}{'p50':>9}{'p95':>9}{'retries':>9}  errors")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<22}{s['calls']:>7}{s['p50_s']:>9}{s['p95_s']:>9}{s['retries']:>9}  {s['errors'] or ''}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
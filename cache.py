@@ -0,0 +1,210 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- LOCAL PERSISTENT CACHE (SQLite) ---
+# Stub providers (PROJECT_ONE_PROVIDERS=mock) get their own directory: fake
+# brand data / images must never be served to live sessions
+MOCK_PROVIDERS = os.environ.get("PROJECT_ONE_PROVIDERS") == "mock"
+CACHE_DIR = os.environ.get("PROJECT_ONE_CACHE_DIR", ".cache-mock" if MOCK_PROVIDERS else ".cache")
+
+
+def stable_hash(obj):
+    """Content hash of any JSON-serializable object (key order independent)."""
+    payload = json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_domain(url):
+    """'https://WWW.Tesla.com/fr' -> 'tesla.com'"""
+    target_url = url if url.startswith("http") else f"https://{url}"
+    domain = target_url.split("://", 1)[1].split("/", 1)[0].split("?", 1)[0].lower()
+    if domain.startswith("www."): domain = domain[4:]
+    return domain
+
+
+class DiskCache:
+    """
+    JSON key/value store on SQLite with TTL and LRU eviction (max_entries).
+    Safe to share between threads and between processes on the same disk.
+    """
+
+    def __init__(self, name, ttl=7 * 24 * 3600, max_entries=500, cache_dir=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        cache_dir = cache_dir or CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, f"{name}.sqlite3")
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self._delete_keys([key])
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return self._decode(json.loads(row[0]))
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(self._encode(key, value)), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._delete_keys([key])
+            self._db.commit()
+
+    def _evict(self):
+        # Least recently used entries go first once we are over max_entries
+        count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if self.max_entries and count > self.max_entries:
+            rows = self._db.execute(
+                "SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?", (count - self.max_entries,)
+            ).fetchall()
+            self._delete_keys([r[0] for r in rows])
+
+    def _delete_keys(self, keys):
+        for key in keys:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    # Hooks for subclasses storing something else than plain JSON
+    def _encode(self, key, value):
+        return value
+
+    def _decode(self, stored):
+        return stored
+
+    def stats(self):
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": size,
+        }
+
+
+class BlobCache(DiskCache):
+    """
+    Same index as DiskCache but values are raw bytes (images, videos) written
+    as files next to the SQLite db, so they never sit in process memory.
+    """
+
+    def __init__(self, name, blob_dir=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.blob_dir = blob_dir or os.path.join(os.path.dirname(self.path), name)
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def _blob_path(self, key):
+        return os.path.join(self.blob_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".bin")
+
+    def _encode(self, key, value):
+        path = self._blob_path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f: f.write(value)
+        os.replace(tmp, path)
+        return {"blob": os.path.basename(path), "size": len(value)}
+
+    def _decode(self, stored):
+        try:
+            with open(os.path.join(self.blob_dir, stored["blob"]), "rb") as f: return f.read()
+        except OSError:
+            return None
+
+    def path_for(self, key):
+        """Path of the blob on disk (or None), for callers that can stream from a file."""
+        path = self._blob_path(key)
+        return path if os.path.exists(path) else None
+
+    def _delete_keys(self, keys):
+        super()._delete_keys(keys)
+        for key in keys:
+            try: os.remove(self._blob_path(key))
+            except OSError: pass
+
+
+# --- PROCESS-WIDE REGISTRY ---
+# Streamlit re-executes app.py on every interaction but imported modules stay
+# loaded, so caches opened here survive reruns and are shared by all sessions.
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, blob=False, **kwargs):
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = (BlobCache if blob else DiskCache)(name, **kwargs)
+        return _caches[name]
+
+
+def cache_stats():
+    """{cache name: stats} for every cache opened in this process."""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: c.stats() for name, c in caches.items()}
+
+
+def memoize(cache_name, namespace, blob=False, valid=None, **cache_kwargs):
+    """
+    Persist the return value of fn, keyed on namespace + canonicalized arguments.
+    Put the model name and prompt template version in namespace so that
+    changing either invalidates old entries. Empty results are not stored,
+    nor results rejected by valid(result) (stored ones it rejects count as misses).
+    Concurrent misses on the same key share one call (single-flight).
+    """
+    usable = lambda value: bool(value) and (valid is None or valid(value))
+    from singleflight import FLIGHTS  # singleflight imports this module
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            cache = get_cache(cache_name, blob=blob, **cache_kwargs)
+            key = f"{namespace}:{stable_hash(bound.arguments)}"
+            cached = cache.get(key)
+            if usable(cached): return cached
+
+            def compute():
+                result = fn(*args, **kwargs)
+                if usable(result): cache.set(key, result)
+                return result
+
+            def recheck():
+                value = cache.get(key)
+                return value if usable(value) else None
+            return FLIGHTS.do(f"{cache_name}:{key}", compute, recheck=recheck)
+        return wrapper
+    return decorator
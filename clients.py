@@ -0,0 +1,115 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- SHARED CLIENTS ---
+# One keep-alive HTTP session and one SDK object per model / key for the whole
+# process: Streamlit reruns app.py on every interaction, but this module is
+# imported once, so TLS connections and SDK setup are reused by every session.
+# Provider seam: get_brand_data only talks HTTP through get_http_session(),
+# Gemini text / Nano Banana through get_generative_model() and Veo through
+# get_genai_client(). PROJECT_ONE_PROVIDERS=mock (or use_providers("mock"))
+# swaps all three for the local stubs in mock_providers.py: no keys, no network.
+# The Google SDKs are slow to import: they are only loaded (and configured) by
+# the first Gemini / Veo call, so the landing page and steps 1-2 never pay for them.
+HTTP_POOL_SIZE = 16
+PROVIDER_MODE = os.environ.get("PROJECT_ONE_PROVIDERS", "live")
+
+_registry = {}
+_lock = threading.Lock()
+_key_locks = {}
+_mock_profile = None
+_old_genai_key = None
+_configure_lock = threading.Lock()
+
+
+def _get_or_create(key, factory):
+    with _lock:
+        if key in _registry: return _registry[key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    # Built under its own key's lock only: a slow SDK import never blocks other lookups
+    with key_lock:
+        with _lock:
+            if key in _registry: return _registry[key]
+        value = factory()
+        with _lock: _registry[key] = value
+        return value
+
+
+def _new_http_session():
+    session = requests.Session()
+    # urllib3 pools are thread-safe; size it for the step-3 thread pool
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _mocks():
+    import mock_providers
+    global _mock_profile
+    if _mock_profile is None: _mock_profile = mock_providers.MockProfile()
+    return mock_providers, _mock_profile
+
+
+def use_providers(mode, profile=None):
+    """
+    'live' or 'mock' (profile: mock_providers.MockProfile). Drops the clients built so far.
+    Cache / media directories are chosen at import: a process switching to mock
+    must point PROJECT_ONE_CACHE_DIR / PROJECT_ONE_MEDIA_DIR elsewhere first (as bench.py does).
+    """
+    global PROVIDER_MODE, _mock_profile
+    with _lock:
+        PROVIDER_MODE = mode
+        _mock_profile = profile
+        _registry.clear()
+
+
+def provider_mode():
+    return PROVIDER_MODE
+
+
+def get_http_session():
+    if PROVIDER_MODE == "mock":
+        mocks, profile = _mocks()
+        return _get_or_create("http", lambda: mocks.MockHTTPSession(profile))
+    return _get_or_create("http", _new_http_session)
+
+
+def _configure_old_genai(api_key):
+    # Old SDK keeps the key in a global client: configure it once per process (per key),
+    # never again while other threads may be mid-call
+    global _old_genai_key
+    import google.generativeai as old_genai
+    with _configure_lock:
+        if _old_genai_key != api_key:
+            old_genai.configure(api_key=api_key)
+            _old_genai_key = api_key
+    return old_genai
+
+
+def _new_generative_model(model_name, api_key):
+    return _configure_old_genai(api_key).GenerativeModel(model_name)
+
+
+def _new_genai_client(api_key):
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+def get_generative_model(model_name, api_key):
+    """Old SDK model (Gemini text / Nano Banana)."""
+    if PROVIDER_MODE == "mock":
+        mocks, profile = _mocks()
+        return _get_or_create(("generative_model", model_name), lambda: mocks.MockGenerativeModel(model_name, profile))
+    return _get_or_create(("generative_model", model_name, api_key), lambda: _new_generative_model(model_name, api_key))
+
+
+def get_genai_client(api_key):
+    """New SDK client (Veo)."""
+    if PROVIDER_MODE == "mock":
+        mocks, profile = _mocks()
+        return _get_or_create(("genai_client", api_key), lambda: mocks.MockGenaiClient(profile))
+    return _get_or_create(("genai_client", api_key), lambda: _new_genai_client(api_key))
@@ -0,0 +1,216 @@
+import codecs
+import ipaddress
+import re
+import socket
+from collections import Counter
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse, parse_qs
+
+# --- TIER 1: PLAIN FETCH + LOCAL HTML PARSING ---
+# Title, meta / Open Graph tags, CSS colors and font-family declarations are
+# read straight from the HTML (and its first stylesheets) without ScrapingBee.
+# Output uses the same shape as BRAND_EXTRACT_RULES so tiers can be merged.
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+MAX_STYLESHEETS = 2
+THIN_PAGE_CHARS = 300  # less visible text than this = JS app shell, needs rendering
+# The server fetches user-typed URLs: public http(s) hosts only, redirects
+# followed by hand (each hop re-checked), bodies capped
+MAX_REDIRECTS = 5
+MAX_HTML_BYTES = 2 * 2**20
+MAX_CSS_BYTES = 512 * 2**10
+REDIRECT_STATUS = (301, 302, 303, 307, 308)
+HEADER_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+
+HEX_RE = re.compile(r"#([0-9a-fA-F]{6}|[0-9a-fA-F]{3})\b")
+FONT_FAMILY_RE = re.compile(r"font-family\s*:\s*([^;}{]+)", re.IGNORECASE)
+GENERIC_FONTS = {
+    "serif", "sans-serif", "monospace", "cursive", "fantasy", "system-ui", "ui-sans-serif", "ui-serif",
+    "ui-monospace", "-apple-system", "blinkmacsystemfont", "inherit", "initial", "unset", "emoji",
+    "segoe ui", "roboto", "helvetica neue", "arial", "helvetica", "apple color emoji", "segoe ui emoji",
+}
+TITLE_SEPARATORS = re.compile(r"\s+[|\-–—:·]\s+")
+
+
+class _BrandHTMLParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.title = ""
+        self.h1 = ""
+        self.stylesheets = []
+        self.font_links = []
+        self.styles = []
+        self.images = []
+        self.text_chars = 0
+        self._stack = []
+
+    def handle_starttag(self, tag, attrs):
+        a = {k.lower(): (v or "") for k, v in attrs}
+        if tag == "meta":
+            key = (a.get("property") or a.get("name") or "").lower()
+            if key and a.get("content") and key not in self.meta: self.meta[key] = a["content"].strip()
+        elif tag == "link":
+            rel, href = a.get("rel", "").lower(), a.get("href", "")
+            if "stylesheet" in rel and href:
+                (self.font_links if "fonts.googleapis.com" in href else self.stylesheets).append(href)
+        elif tag == "img":
+            src = a.get("src") or a.get("data-src") or ""
+            if src and not src.startswith("data:") and not src.lower().endswith(".svg"):
+                self.images.append({"src": src, "alt": a.get("alt", "")})
+        if a.get("style"): self.styles.append(a["style"])
+        if tag not in ("meta", "link", "img", "br", "hr", "input", "source"): self._stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._stack:
+            while self._stack and self._stack.pop() != tag: pass
+
+    def handle_data(self, data):
+        current = self._stack[-1] if self._stack else ""
+        if current == "style": self.styles.append(data)
+        elif current == "title": self.title += data
+        elif current in ("script", "noscript", "template"): return
+        else:
+            text = data.strip()
+            self.text_chars += len(text)
+            if "h1" in self._stack and len(self.h1) < 200: self.h1 += (" " if self.h1 else "") + text
+
+
+def _normalize_hex(value):
+    value = value.upper()
+    if len(value) == 4: value = "#" + "".join(c * 2 for c in value[1:])
+    return value
+
+
+def _colors(css_chunks, theme_color=None):
+    counts = Counter(_normalize_hex(m.group(0)) for css in css_chunks for m in HEX_RE.finditer(css))
+    # White / black are added later by the Smart Colors step
+    ranked = [c for c, _ in counts.most_common() if c not in ("#FFFFFF", "#000000")]
+    if theme_color and HEX_RE.fullmatch(theme_color.strip()):
+        theme = _normalize_hex(theme_color.strip())
+        ranked = [theme] + [c for c in ranked if c != theme]
+    return [{"hex_code": c} for c in ranked[:5]]
+
+
+def _fonts(css_chunks, font_links):
+    counts = Counter()
+    for href in font_links:
+        for family in parse_qs(urlparse(href).query).get("family", []):
+            counts[family.split(":")[0].replace("+", " ")] += 10
+    for css in css_chunks:
+        for decl in FONT_FAMILY_RE.findall(css):
+            first = decl.split(",")[0].strip().strip("'\"").strip()
+            if first and not first.startswith("var(") and first.lower() not in GENERIC_FONTS:
+                counts[first] += 1
+    names = [name for name, _ in counts.most_common(2)]
+    return [{"font_name": name, "use": use} for name, use in zip(names, ("Primary", "Secondary"))]
+
+
+def parse_brand_html(html, base_url, stylesheets_css=()):
+    """Brand fields found in the page itself."""
+    p = _BrandHTMLParser()
+    p.feed(html)
+    return _brand_fields(p, base_url, stylesheets_css)
+
+
+def _brand_fields(p, base_url, stylesheets_css=()):
+    meta = p.meta
+    title = " ".join(p.title.split())
+    title_parts = TITLE_SEPARATORS.split(title) if title else []
+
+    data = {}
+    name = meta.get("og:site_name") or meta.get("application-name") or (title_parts[0] if title_parts else "")
+    if name: data["projectName"] = name
+    tagline = " ".join(p.h1.split()) or (title_parts[1] if len(title_parts) > 1 else "")
+    if tagline: data["tagline"] = tagline
+    concept = meta.get("description") or meta.get("og:description") or meta.get("twitter:description")
+    if concept: data["concept"] = concept
+
+    css_chunks = list(p.styles) + list(stylesheets_css)
+    colors = _colors(css_chunks, meta.get("theme-color"))
+    if colors: data["colors"] = colors
+    fonts = _fonts(css_chunks, p.font_links)
+    if fonts: data["fonts"] = fonts
+
+    images, seen = [], set()
+    og_image = meta.get("og:image") or meta.get("twitter:image")
+    for img in ([{"src": og_image, "alt": "og:image"}] if og_image else []) + p.images:
+        src = urljoin(base_url, img["src"])
+        if src not in seen:
+            seen.add(src)
+            images.append({"src": src, "alt": img["alt"]})
+    if images: data["images"] = images[:4]
+    return data
+
+
+def is_public_url(url):
+    """http(s) URL whose host only resolves to public addresses (no localhost, private, link-local...)."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname: return False
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        infos = socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)
+        return bool(infos) and all(ipaddress.ip_address(info[4][0].split("%")[0]).is_global for info in infos)
+    except (OSError, UnicodeError, ValueError):
+        return False
+
+
+def _charset(content_type, body):
+    # Header charset, else <meta charset> / http-equiv, else UTF-8 (requests would
+    # assume ISO-8859-1 for any text/* without a charset: mojibake on UTF-8 pages)
+    match = HEADER_CHARSET_RE.search(content_type) or META_CHARSET_RE.search(body[:4096])
+    if match:
+        name = match.group(1)
+        name = name.decode("ascii", "ignore") if isinstance(name, bytes) else name
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def _capped_get(http_get, url, headers, timeout, max_bytes, allow_url):
+    """(status, final url, content type, text) or None if a hop is not allowed / too many redirects."""
+    for _ in range(MAX_REDIRECTS + 1):
+        if allow_url and not allow_url(url): return None
+        response = http_get(url, headers=headers, timeout=timeout, allow_redirects=False, stream=True)
+        location = response.headers.get("Location")
+        if response.status_code in REDIRECT_STATUS and location:
+            response.close()
+            url = urljoin(url, location)
+            continue
+        body = b""
+        try:
+            for chunk in response.iter_content(64 * 1024):
+                body += chunk
+                if len(body) >= max_bytes: break  # parse the beginning only
+        finally:
+            response.close()
+        text = body[:max_bytes].decode(_charset(response.headers.get("Content-Type", ""), body), errors="replace")
+        return response.status_code, url, response.headers.get("Content-Type", "html"), text
+    return None
+
+
+def fetch_static_brand(http_get, target_url, timeout=10, allow_url=is_public_url):
+    """
+    Tier 1. http_get has the requests.get signature. Returns (data, is_thin):
+    is_thin means the HTML is a JS app shell (or could not be fetched) and the
+    rendered extraction should be used. allow_url(url) vets every URL fetched.
+    """
+    headers = {"User-Agent": USER_AGENT, "Accept-Language": "en"}
+    page = _capped_get(http_get, target_url, headers, timeout, MAX_HTML_BYTES, allow_url)
+    if not page or page[0] != 200 or "html" not in page[2]:
+        return {}, True
+    _, page_url, _, html = page
+    parser = _BrandHTMLParser()
+    parser.feed(html)
+
+    css = []
+    for href in parser.stylesheets[:MAX_STYLESHEETS]:
+        try:
+            r = _capped_get(http_get, urljoin(page_url, href), headers, timeout / 2, MAX_CSS_BYTES, allow_url)
+            if r and r[0] == 200: css.append(r[3])
+        except Exception:
+            continue
+    return _brand_fields(parser, page_url, css), parser.text_chars < THIN_PAGE_CHARS
@@ -0,0 +1,156 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+
+from cache import BlobCache, MOCK_PROVIDERS
+
+# --- MEDIA STORE ---
+# Generated images are written once to static/media/ (content-addressed, so two
+# sessions showing the same image share one file) and st.session_state only
+# keeps the small handle ("<sha>.png"); finished Veo videos are linked in as
+# "<job_id>.mp4". The browser loads them by URL through
+# Streamlit static serving (.streamlit/config.toml), so reruns send no bytes.
+# Sessions touch their handles on each render; media nobody displayed for
+# idle_ttl seconds (expired sessions) is swept from disk.
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+MEDIA_SUBDIR = "mock-media" if MOCK_PROVIDERS else "media"  # stub images stay apart from live ones
+MEDIA_DIR = os.environ.get("PROJECT_ONE_MEDIA_DIR") or os.path.join(APP_DIR, "static", MEDIA_SUBDIR)
+MEDIA_URL_PREFIX = f"app/static/{MEDIA_SUBDIR}"
+
+# Display renditions: each original is decoded once and re-encoded at these
+# widths (WebP, JPEG if Pillow has no WebP codec), stored next to it as
+# "<sha>.w<width>.<ext>". Pages load a rendition; the original stays for download.
+RENDITION_WIDTHS = (640, 1280)
+RENDITION_QUALITY = 80
+RENDITION_EXTS = {"WEBP": ".webp", "JPEG": ".jpg"}
+_pillow = None
+
+
+def _get_pillow():
+    """(PIL.Image, rendition format) or (None, None) without Pillow; imported with the first image, not at startup."""
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image, features
+            _pillow = (Image, "WEBP" if features.check("webp") else "JPEG")
+        except ImportError:  # optional: without Pillow pages show the originals
+            _pillow = (None, None)
+    return _pillow
+
+_MAGIC = ((b"\x89PNG", ".png"), (b"\xff\xd8", ".jpg"), (b"GIF8", ".gif"))
+
+
+def guess_extension(data):
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP": return ".webp"
+    for magic, ext in _MAGIC:
+        if data.startswith(magic): return ext
+    return ".png"
+
+
+class MediaStore(BlobCache):
+
+    def __init__(self, name="media", idle_ttl=6 * 3600, max_entries=5000, sweep_every=600, **kwargs):
+        super().__init__(name, blob_dir=MEDIA_DIR, ttl=None, max_entries=max_entries, **kwargs)
+        self.idle_ttl = idle_ttl
+        self.sweep_every = sweep_every
+        self._last_sweep = 0
+
+    # Handles are already safe file names
+    def _blob_path(self, key):
+        return os.path.join(self.blob_dir, key)
+
+    def put(self, data, ext=None):
+        """Store bytes, return a handle for st.session_state (None stays None)."""
+        if not data: return None
+        handle = hashlib.sha256(data).hexdigest()[:32] + (ext or guess_extension(data))
+        if not self.touch(handle): self.set(handle, data)
+        self._add_renditions(handle, data)
+        self.sweep()
+        return handle
+
+    def put_file(self, path, handle):
+        """Publish a file already on disk (Veo mp4) under handle: hard link, copy if the disk can't."""
+        if self.touch(handle): return handle
+        target = self._blob_path(handle)
+        tmp = f"{target}.{threading.get_ident()}.tmp"
+        try: os.link(path, tmp)
+        except OSError: shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (handle, json.dumps({"blob": handle, "size": os.path.getsize(target)}), now, now),
+            )
+            self._evict()
+            self._db.commit()
+        return handle
+
+    def rendition_handles(self, handle, ext):
+        """[(width, handle)] of the display renditions of an original in one format."""
+        stem = os.path.splitext(handle)[0]
+        return [(w, f"{stem}.w{w}{ext}") for w in RENDITION_WIDTHS]
+
+    def _add_renditions(self, handle, data):
+        Image, fmt = _get_pillow()
+        if Image is None: return
+        # Already there (same image generated before): nothing to decode
+        todo = [(w, r) for w, r in self.rendition_handles(handle, RENDITION_EXTS[fmt]) if not self.touch(r)]
+        if not todo: return
+        try:
+            img = Image.open(io.BytesIO(data))
+            img.load()
+        except Exception:
+            return  # not an image Pillow can read: pages fall back to the original
+        if img.mode not in ("RGB", "L"): img = img.convert("RGB")
+        # Largest first, each resize starts from the previous (smaller) one
+        for width, rendition in sorted(todo, reverse=True):
+            if img.width > width: img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, fmt, quality=RENDITION_QUALITY)
+            self.set(rendition, buf.getvalue())
+
+    def srcset(self, handle):
+        """srcset attribute value for the renditions still on disk ('' if none). No Pillow needed."""
+        for ext in RENDITION_EXTS.values():
+            found = [f"{MEDIA_URL_PREFIX}/{r} {w}w" for w, r in self.rendition_handles(handle, ext) if self.touch(r)]
+            if found: return ", ".join(found)
+        return ""
+
+    def touch(self, handle):
+        """Mark a handle as still displayed; False if it is gone."""
+        if not handle or not os.path.exists(self._blob_path(handle)): return False
+        with self._lock:
+            cur = self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), handle))
+            self._db.commit()
+        return cur.rowcount > 0
+
+    def url(self, handle):
+        """Browser URL of a handle (None if evicted)."""
+        return f"{MEDIA_URL_PREFIX}/{handle}" if self.touch(handle) else None
+
+    def sweep(self, force=False):
+        now = time.time()
+        if not force and now - self._last_sweep < self.sweep_every: return
+        self._last_sweep = now
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key FROM entries WHERE accessed_at < ?", (now - self.idle_ttl,)
+            ).fetchall()
+            self._delete_keys([r[0] for r in rows])
+            self._db.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_media_store():
+    global _store
+    with _store_lock:
+        if _store is None: _store = MediaStore()
+        return _store
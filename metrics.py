@@ -0,0 +1,189 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# --- PIPELINE METRICS ---
+# Each upstream stage (ScrapingBee, Gemini text, Nano Banana, Veo) is wrapped in
+# track("<stage>"): latency histogram, outcome, error class, payload sizes and
+# token usage. Exported as Prometheus text or appended as JSON lines to
+# $PROJECT_ONE_METRICS_JSONL, and summarized in the app debug panel (?debug=1).
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+RECENT_SAMPLES = 500
+METRICS_JSONL = os.environ.get("PROJECT_ONE_METRICS_JSONL")
+
+
+class _StageStats:
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self.outcomes = {}
+        self.errors = {}
+        self.retries = 0
+        self.bytes = {"in": 0, "out": 0}
+        self.tokens = {"prompt": 0, "output": 0}
+
+
+class MetricsRegistry:
+
+    def __init__(self, jsonl_path=None):
+        self._stages = {}
+        self._lock = threading.Lock()
+        self.jsonl_path = jsonl_path
+
+    def _stage(self, name):
+        if name not in self._stages: self._stages[name] = _StageStats()
+        return self._stages[name]
+
+    def observe(self, stage, latency, outcome="ok", error=None, bytes_in=0, bytes_out=0, prompt_tokens=0, output_tokens=0):
+        with self._lock:
+            s = self._stage(stage)
+            s.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            s.latency_sum += latency
+            s.count += 1
+            s.recent.append(latency)
+            s.outcomes[outcome] = s.outcomes.get(outcome, 0) + 1
+            if error: s.errors[error] = s.errors.get(error, 0) + 1
+            s.bytes["in"] += bytes_in
+            s.bytes["out"] += bytes_out
+            s.tokens["prompt"] += prompt_tokens
+            s.tokens["output"] += output_tokens
+        if self.jsonl_path:
+            event = {
+                "ts": round(time.time(), 3), "stage": stage, "latency": round(latency, 4), "outcome": outcome,
+                "error": error, "bytes_in": bytes_in, "bytes_out": bytes_out,
+                "prompt_tokens": prompt_tokens, "output_tokens": output_tokens,
+            }
+            with self._lock, open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event) + "\n")
+
+    def has(self, stage):
+        with self._lock: return stage in self._stages
+
+    def retry(self, stage, n=1):
+        with self._lock:
+            self._stage(stage).retries += n
+
+    def summary(self):
+        """{stage: count, p50, p95, mean, errors, ...} for display."""
+        with self._lock:
+            out = {}
+            for name, s in sorted(self._stages.items()):
+                recent = sorted(s.recent)
+                pct = lambda q: round(recent[min(len(recent) - 1, int(q * len(recent)))], 3) if recent else None
+                out[name] = {
+                    "calls": s.count,
+                    "p50_s": pct(0.5),
+                    "p95_s": pct(0.95),
+                    "mean_s": round(s.latency_sum / s.count, 3) if s.count else None,
+                    "errors": dict(s.errors),
+                    "retries": s.retries,
+                    "bytes_in": s.bytes["in"],
+                    "bytes_out": s.bytes["out"],
+                    "prompt_tokens": s.tokens["prompt"],
+                    "output_tokens": s.tokens["output"],
+                }
+            return out
+
+    def to_prometheus(self, prefix="project_one"):
+        families = {
+            "stage_latency_seconds": ("histogram", []),
+            "stage_calls_total": ("counter", []),
+            "stage_errors_total": ("counter", []),
+            "stage_retries_total": ("counter", []),
+            "stage_payload_bytes_total": ("counter", []),
+            "stage_tokens_total": ("counter", []),
+        }
+
+        def add(family, labels, value, suffix=""):
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            families[family][1].append(f"{prefix}_{family}{suffix}{{{label_str}}} {value}")
+
+        with self._lock:
+            for name, s in sorted(self._stages.items()):
+                cumulative = 0
+                for le, n in zip(LATENCY_BUCKETS + ("+Inf",), s.buckets):
+                    cumulative += n
+                    add("stage_latency_seconds", {"stage": name, "le": le}, cumulative, "_bucket")
+                add("stage_latency_seconds", {"stage": name}, f"{s.latency_sum:.6f}", "_sum")
+                add("stage_latency_seconds", {"stage": name}, s.count, "_count")
+                for outcome, n in sorted(s.outcomes.items()):
+                    add("stage_calls_total", {"stage": name, "outcome": outcome}, n)
+                for error, n in sorted(s.errors.items()):
+                    add("stage_errors_total", {"stage": name, "error": error}, n)
+                add("stage_retries_total", {"stage": name}, s.retries)
+                for direction, n in s.bytes.items():
+                    add("stage_payload_bytes_total", {"stage": name, "direction": direction}, n)
+                for kind, n in s.tokens.items():
+                    add("stage_tokens_total", {"stage": name, "kind": kind}, n)
+
+        lines = []
+        for family, (kind, samples) in families.items():
+            lines.append(f"# TYPE {prefix}_{family} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry(METRICS_JSONL)
+
+
+class track:
+    """
+    with track("gemini_campaign") as t:
+        ...
+        t.sent(prompt); t.usage(response)
+    An exception leaving the block, or t.fail(e) for swallowed ones, counts as an error.
+    """
+
+    def __init__(self, stage, registry=None):
+        self.stage = stage
+        self.registry = registry or REGISTRY
+        self.error = None
+        self.outcome = "ok"
+        self.bytes_in = self.bytes_out = 0
+        self.prompt_tokens = self.output_tokens = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None: self.fail(exc)
+        self.registry.observe(
+            self.stage, time.perf_counter() - self._start, self.outcome, self.error,
+            self.bytes_in, self.bytes_out, self.prompt_tokens, self.output_tokens,
+        )
+        return False
+
+    def fail(self, error):
+        self.outcome = "error"
+        self.error = error if isinstance(error, str) else type(error).__name__
+
+    def retry(self):
+        self.registry.retry(self.stage)
+
+    def empty(self):
+        """Call succeeded but returned nothing usable (safety filter, empty JSON...)."""
+        if self.outcome == "ok": self.outcome = "empty"
+
+    def sent(self, payload):
+        self.bytes_out += len(payload.encode("utf-8") if isinstance(payload, str) else payload)
+
+    def received(self, payload):
+        self.bytes_in += len(payload.encode("utf-8") if isinstance(payload, str) else payload)
+
+    def usage(self, response):
+        # Gemini responses expose usage_metadata; missing on some preview models
+        meta = getattr(response, "usage_metadata", None)
+        if meta is None: return
+        self.prompt_tokens += getattr(meta, "prompt_token_count", 0) or 0
+        self.output_tokens += getattr(meta, "candidates_token_count", 0) or 0
+
+
+def observe(stage, latency, **kwargs):
+    REGISTRY.observe(stage, latency, **kwargs)
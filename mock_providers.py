@@ -0,0 +1,305 @@
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import requests
+
+# --- LOCAL STUB PROVIDERS ---
+# Offline stand-ins for the three client surfaces of clients.py: HTTP session
+# (site fetch + ScrapingBee), old-SDK GenerativeModel (Gemini text / Nano
+# Banana) and new-SDK genai.Client (Veo). They return canned payloads built
+# from the request (same domain / prompt = same payload, so caches and
+# single-flight behave as in production) after a simulated latency, and fail
+# with 5xx / 429 at the rates of a MockProfile, so the scheduler retries,
+# metrics and fallbacks all run. Used by bench.py and PROJECT_ONE_PROVIDERS=mock.
+
+
+class MockProfile:
+    """
+    latency: provider -> (median seconds, log-normal sigma); scale multiplies all of them.
+    error_rate / rate_limit_rate: share of calls answered 503 / 429.
+    thin_rate: share of sites served as JS app shells (forces the rendered tier).
+    empty_rate: share of image / video calls blocked by the "safety filter".
+    """
+    LATENCY = {
+        "site": (0.3, 0.5),
+        "scrapingbee": (4.0, 0.4),
+        "scrapingbee_render": (9.0, 0.4),
+        "gemini": (3.0, 0.3),
+        "nano_banana": (8.0, 0.3),
+        "veo": (0.5, 0.3),
+        "veo_render": (60.0, 0.2),
+    }
+
+    def __init__(self, scale=1.0, error_rate=0.02, rate_limit_rate=0.02, thin_rate=0.2, empty_rate=0.01,
+                 latency=None, image_kb=1500, video_kb=4000, seed=None):
+        self.scale = scale
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.thin_rate = thin_rate
+        self.empty_rate = empty_rate
+        self.latency = dict(self.LATENCY, **(latency or {}))
+        self.image_kb = image_kb
+        self.video_kb = video_kb
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def uniform(self):
+        with self._lock: return self._random.random()
+
+    def duration(self, provider):
+        median, sigma = self.latency[provider]
+        with self._lock: return median * math.exp(self._random.gauss(0, sigma)) * self.scale
+
+    def outcome(self):
+        """None, 429 or 503 for the next call."""
+        roll = self.uniform()
+        if roll < self.rate_limit_rate: return 429
+        if roll < self.rate_limit_rate + self.error_rate: return 503
+        return None
+
+    def call(self, provider):
+        time.sleep(self.duration(provider))
+        return self.outcome()
+
+
+class MockAPIError(Exception):
+    """Carries the HTTP status in .code, like google.api_core / google.genai errors."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def _pick(seed, options, n=1):
+    """Deterministic choice: the same seed always gets the same values."""
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    return [options[(digest[i] + i) % len(options)] for i in range(n)]
+
+
+def _fraction(seed):
+    return int(hashlib.sha256(seed.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+# --- HTTP: site fetch + ScrapingBee ---
+COLORS = ["#1A1A2E", "#E94560", "#0F3460", "#16213E", "#F5A623", "#2ECC71", "#8E44AD", "#C0392B", "#D4AF37", "#2C3E50"]
+FONTS = ["Playfair Display", "Montserrat", "Lora", "Poppins", "Cormorant Garamond", "Inter", "DM Serif Display"]
+INDUSTRIES = ["Luxury Fashion", "Specialty Coffee", "Consumer Electronics", "Skincare", "Boutique Hotels", "Fintech"]
+ADJECTIVES = ["Minimal", "Bold", "Elegant", "Warm", "Futuristic", "Organic", "Playful", "Refined"]
+VALUES = ["Craftsmanship", "Sustainability", "Innovation", "Transparency", "Community", "Heritage"]
+TONES = ["Confident", "Friendly", "Poetic", "Direct", "Witty", "Calm"]
+
+
+def _brand(domain):
+    name = domain.split(".")[0].replace("-", " ").title()
+    return {
+        "projectName": name,
+        "tagline": f"{name}, made to last.",
+        "industry": _pick(domain + "industry", INDUSTRIES)[0],
+        "concept": f"{name} designs and sells premium products for people who care about detail. " * 2,
+        "colors": [{"hex_code": c} for c in _pick(domain + "colors", COLORS, 4)],
+        "fonts": [{"font_name": f, "use": u} for f, u in zip(_pick(domain + "fonts", FONTS, 2), ("Primary", "Secondary"))],
+        "aesthetic": [{"keyword": k} for k in _pick(domain + "aesthetic", ADJECTIVES, 4)],
+        "values": [{"value": v} for v in _pick(domain + "values", VALUES, 4)],
+        "tone": [{"keyword": k} for k in _pick(domain + "tone", TONES, 4)],
+        "images": [{"src": f"https://{domain}/img/hero-{i}.jpg", "alt": f"{name} {i}"} for i in range(1, 5)],
+    }
+
+
+def _site_html(domain, brand):
+    fonts = "|".join(f["font_name"].replace(" ", "+") for f in brand["fonts"])
+    paragraphs = "".join(f"<p>{brand['concept']}</p>" for _ in range(3))
+    return f"""<!doctype html><html><head>
+<title>{brand['projectName']} | {brand['tagline']}</title>
+<meta name="description" content="{brand['concept'].strip()}">
+<meta property="og:image" content="/img/og.jpg">
+<meta name="theme-color" content="{brand['colors'][0]['hex_code']}">
+<link rel="stylesheet" href="https://fonts.googleapis.com/css2?family={fonts}">
+<link rel="stylesheet" href="/assets/main.css">
+</head><body><h1>{brand['tagline']}</h1>{paragraphs}
+<img src="/img/hero-1.jpg" alt="hero"><img src="/img/hero-2.jpg" alt="product"></body></html>"""
+
+
+def _site_css(brand):
+    rules = [f".c{i} {{ color: {c['hex_code']}; }}" for i, c in enumerate(brand["colors"])] * 3
+    return "\n".join(rules + [f"body {{ font-family: '{brand['fonts'][0]['font_name']}', sans-serif; }}"])
+
+
+def _response(url, status, body, content_type="text/html; charset=utf-8", headers=None):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response._content = body.encode("utf-8") if isinstance(body, str) else body
+    response._content_consumed = True  # iter_content() serves _content, no socket behind it
+    response.encoding = "utf-8"
+    response.headers["Content-Type"] = content_type
+    response.headers.update(headers or {})
+    return response
+
+
+class MockHTTPSession:
+    """requests.Session.get() for brand sites and the ScrapingBee API."""
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs):
+        if urlparse(url).netloc == "app.scrapingbee.com": return self._scrapingbee(url, params or {})
+        return self._site(url)
+
+    def _site(self, url):
+        status = self.profile.call("site")
+        if status: return _response(url, status, "", headers={"Retry-After": "1"} if status == 429 else None)
+        domain = urlparse(url).netloc.removeprefix("www.")
+        brand = _brand(domain)
+        if url.endswith(".css"): return _response(url, 200, _site_css(brand), "text/css")
+        if _fraction(domain + "thin") < self.profile.thin_rate:
+            return _response(url, 200, "<html><head><title>Loading</title></head><body><div id='root'></div></body></html>")
+        return _response(url, 200, _site_html(domain, brand))
+
+    def _scrapingbee(self, url, params):
+        render = params.get("render_js") == "true"
+        status = self.profile.call("scrapingbee_render" if render else "scrapingbee")
+        if status: return _response(url, status, json.dumps({"error": "mock"}), "application/json")
+        brand = _brand(urlparse(params["url"]).netloc.removeprefix("www."))
+        rules = json.loads(params.get("ai_extract_rules") or "{}")
+        return _response(url, 200, json.dumps({k: brand.get(k) for k in rules}), "application/json")
+
+
+# --- GEMINI TEXT / NANO BANANA ---
+def _png(width, height, rgb, padding_kb=0):
+    """Solid-colour PNG; padding_kb of random bytes in an ancillary chunk gives it a realistic size."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    row = b"\x00" + bytes(rgb) * width
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    body = chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(row * height, 1))
+    if padding_kb: body += chunk(b"prVt", os.urandom(padding_kb * 1024))
+    return b"\x89PNG\r\n\x1a\n" + body + chunk(b"IEND", b"")
+
+
+def _campaigns(tag):
+    return [{
+        "campaign_name": f"Campaign {i} {tag}",
+        "campaign_description": f"A cinematic concept ({tag}) built around the brand values.",
+        "image_prompt_structure": {"final_constructed_prompt": f"Cinematic landscape shot {i}, golden hour, brand {tag}"},
+    } for i in range(1, 4)]
+
+
+def _video(tag):
+    return {"video_title": f"Signature film {tag}", "video_description": "Slow dolly across the product at dawn.",
+            "video_prompt": f"Cinematic drone shot, slow motion, 4k, brand {tag}"}
+
+
+def _social(tag):
+    return {"instagram_final_prompt": f"Instagram profile UI, flat design, 8k, brand {tag}",
+            "tiktok_final_prompt": f"TikTok profile UI, dark mode, 8k, brand {tag}"}
+
+
+SECTION_PAYLOADS = {"campaign": _campaigns, "video": _video, "social": _social}
+PROMPT_SECTIONS = (("Luxury Brand Strategist", "campaign"), ("Commercial Film Director", "video"), ("Art Director", "social"))
+
+
+class MockGenerativeModel:
+    """GenerativeModel.generate_content(): JSON text when asked for JSON, otherwise one PNG part."""
+
+    def __init__(self, model_name, profile):
+        self.model_name = model_name
+        self.profile = profile
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        config = generation_config or {}
+        json_mode = config.get("response_mime_type") == "application/json"
+        status = self.profile.call("gemini" if json_mode else "nano_banana")
+        if status: raise MockAPIError(status, "Resource exhausted" if status == 429 else "Service unavailable")
+        tag = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=0)
+
+        if json_mode:
+            schema = config.get("response_schema")
+            if schema: payload = {s: SECTION_PAYLOADS[s](tag) for s in schema.get("properties", {})}
+            else: payload = next((SECTION_PAYLOADS[s](tag) for marker, s in PROMPT_SECTIONS if marker in prompt), {})
+            text = json.dumps(payload)
+            usage.candidates_token_count = len(text) // 4
+            return SimpleNamespace(text=text, parts=[SimpleNamespace(text=text)], usage_metadata=usage)
+
+        if self.profile.uniform() < self.profile.empty_rate:
+            return SimpleNamespace(text="", parts=[], usage_metadata=usage)  # safety filter
+        size = (576, 1024) if "9:16" in prompt else (1024, 576)
+        data = _png(*size, rgb=bytes.fromhex(tag[:6]), padding_kb=self.profile.image_kb)
+        usage.candidates_token_count = 1290
+        return SimpleNamespace(text="", parts=[SimpleNamespace(inline_data=SimpleNamespace(data=data, mime_type="image/png"))], usage_metadata=usage)
+
+
+# --- VEO ---
+class _MockOperations:
+
+    def __init__(self, client):
+        self._client = client
+
+    def get(self, operation):
+        return self._client._operation(operation.name)
+
+
+class _MockModels:
+
+    def __init__(self, client):
+        self._client = client
+
+    def generate_videos(self, model, prompt, **kwargs):
+        return self._client._submit(prompt)
+
+
+class _MockFiles:
+
+    def __init__(self, client):
+        self._client = client
+
+    def download(self, file):
+        self._client._check()
+        return b"\x00\x00\x00\x18ftypmp42" + os.urandom(self._client.profile.video_kb * 1024)
+
+
+class MockGenaiClient:
+    """genai.Client: models.generate_videos, operations.get and files.download for Veo."""
+
+    operation_type = SimpleNamespace  # stands for types.GenerateVideosOperation
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.models = _MockModels(self)
+        self.operations = _MockOperations(self)
+        self.files = _MockFiles(self)
+        self._ops = {}  # operation name -> (ready at, blocked)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _check(self):
+        status = self.profile.call("veo")
+        if status: raise MockAPIError(status, "Resource exhausted" if status == 429 else "Service unavailable")
+
+    def _submit(self, prompt):
+        self._check()
+        name = f"models/veo/operations/mock-{next(self._ids)}"
+        ready_at = time.time() + self.profile.duration("veo_render")
+        with self._lock: self._ops[name] = (ready_at, self.profile.uniform() < self.profile.empty_rate)
+        return self._operation(name, check=False)
+
+    def _operation(self, name, check=True):
+        if check: self._check()
+        # Unknown name = operation started before a restart: report it finished
+        with self._lock: ready_at, blocked = self._ops.get(name, (0, False))
+        done = time.time() >= ready_at
+        response = None
+        if done and not blocked:
+            response = SimpleNamespace(generated_videos=[SimpleNamespace(video=SimpleNamespace(uri=f"mock://{name}"))])
+        return SimpleNamespace(name=name, done=done, response=response, error=None)
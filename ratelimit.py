@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+
+import requests
+
+# --- PER-PROVIDER CALL SCHEDULER ---
+# Every upstream call goes through call("<provider>", fn, ...):
+#   - token bucket (requests per minute, set by batch.py; unlimited in the app),
+#   - concurrency cap (semaphore),
+#   - retries on 429 / 5xx / network errors with jittered exponential backoff
+#     (Retry-After honoured up to max_delay, longer = give up), limited by a retry budget so a failing provider
+#     is not hammered,
+#   - a 429 pauses the whole provider (every caller waits) and halves its rate;
+#     successes slowly bring the rate back (AIMD).
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout)
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute, burst=None):
+        self.max_rate = self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, int(per_minute // 6))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def wait_time(self):
+        """Seconds until a token is available (0 = now), without taking it."""
+        with self._lock:
+            tokens = min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+            return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def slow_down(self):
+        with self._lock: self.rate = max(self.max_rate / 16, self.rate / 2)
+
+    def speed_up(self):
+        with self._lock: self.rate = min(self.max_rate, self.rate * 1.05)
+
+
+class RetryBudget:
+    """Each call earns `ratio` of a retry, each retry spends one (capped at `cap`)."""
+
+    def __init__(self, ratio=0.2, cap=10):
+        self.ratio = ratio
+        self.cap = cap
+        self.balance = cap
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock: self.balance = min(self.cap, self.balance + self.ratio)
+
+    def spend(self):
+        with self._lock:
+            if self.balance < 1: return False
+            self.balance -= 1
+            return True
+
+
+class ProviderScheduler:
+
+    def __init__(self, name, max_concurrency=8, max_attempts=4, base_delay=1.0, max_delay=30.0):
+        self.name = name
+        self.bucket = None
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = RetryBudget()
+        self.set_concurrency(max_concurrency)
+        self._paused_until = 0.0
+
+    def set_concurrency(self, n):
+        self.max_concurrency = n
+        self._slots = threading.BoundedSemaphore(n)
+
+    def _wait_if_paused(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0: time.sleep(delay)
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay = random.uniform(delay / 2, delay)  # jitter: callers don't retry in lockstep
+        if retry_after: delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def call(self, fn, *args, tracker=None, **kwargs):
+        """
+        fn(*args, **kwargs) with throttling and retries. Returns fn's result;
+        a retryable HTTP response is returned as-is once attempts run out.
+        tracker (metrics.track) gets one retry() per retry.
+        """
+        attempt = 0
+        while True:
+            self._wait_if_paused()
+            if self.bucket: self.bucket.acquire()
+            with self._slots:
+                error, result = None, None
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    error = e
+            status = _status_of(error, result)
+            retryable = status in RETRYABLE_STATUS or isinstance(error, RETRYABLE_ERRORS)
+
+            if not retryable:
+                self.budget.earn()
+                if self.bucket: self.bucket.speed_up()
+                if error is not None: raise error
+                return result
+
+            attempt += 1
+            retry_after = _retry_after(error, result)
+            delay = self._backoff(attempt - 1, retry_after)  # never more than max_delay
+            if status == 429:
+                # Rate limited: pause everybody on this provider, not just this caller
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                if self.bucket: self.bucket.slow_down()
+            # Retry-After longer than we can wait: give up now rather than after max_delay
+            too_long = retry_after is not None and retry_after > self.max_delay
+            if too_long or attempt >= self.max_attempts or not self.budget.spend():
+                if error is not None: raise error
+                return result
+            if tracker: tracker.retry()
+            time.sleep(delay)
+
+
+def _status_of(error, result):
+    if error is not None:
+        # google.api_core / google.genai errors carry the HTTP status in .code
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        return code if isinstance(code, int) else None
+    return getattr(result, "status_code", None) if isinstance(result, requests.Response) else None
+
+
+def _retry_after(error, result):
+    headers = getattr(result, "headers", None) or getattr(getattr(error, "response", None), "headers", None) or {}
+    try: return float(headers.get("Retry-After"))
+    except (TypeError, ValueError): return None
+
+
+# Default concurrency caps for the interactive app (batch.py adds rate limits)
+_schedulers = {
+    "site": ProviderScheduler("site", max_concurrency=16, max_attempts=2, base_delay=0.5),
+    "scrapingbee": ProviderScheduler("scrapingbee", max_concurrency=5),
+    "gemini": ProviderScheduler("gemini", max_concurrency=16),
+    "nano_banana": ProviderScheduler("nano_banana", max_concurrency=8),
+    "veo": ProviderScheduler("veo", max_concurrency=4, max_attempts=3, base_delay=5.0, max_delay=60.0),
+    # Veo submissions only (paid renders); polls / downloads stay on "veo"
+    "veo_submit": ProviderScheduler("veo_submit", max_concurrency=4, max_attempts=3, base_delay=5.0, max_delay=60.0),
+}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(provider):
+    with _schedulers_lock:
+        if provider not in _schedulers: _schedulers[provider] = ProviderScheduler(provider)
+        return _schedulers[provider]
+
+
+def set_rate_limit(provider, per_minute, burst=None):
+    get_scheduler(provider).bucket = TokenBucket(per_minute, burst) if per_minute else None
+
+
+def wait_time(provider):
+    """Seconds before `provider` has a token (0 without rate limit); lets a caller skip instead of blocking."""
+    bucket = get_scheduler(provider).bucket
+    return bucket.wait_time() if bucket else 0.0
+
+
+def set_concurrency(provider, n):
+    get_scheduler(provider).set_concurrency(n)
+
+
+def call(provider, fn, *args, **kwargs):
+    return get_scheduler(provider).call(fn, *args, **kwargs)
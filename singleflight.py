@@ -0,0 +1,91 @@
+import copy
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process mode only
+    fcntl = None
+
+from cache import CACHE_DIR
+
+# --- SINGLE-FLIGHT ---
+# When several sessions ask for the same thing at once (same domain, same
+# prompt), the first caller runs it and the others wait for its result.
+# Multi-process mode (PROJECT_ONE_SINGLEFLIGHT=file, e.g. several Streamlit
+# servers on one disk): the leader also holds a file lock; a leader in another
+# process waits for it, then calls `recheck` (a cache lookup) before doing
+# the work itself, so the result written by the first process is reused.
+SINGLEFLIGHT_MODE = os.environ.get("PROJECT_ONE_SINGLEFLIGHT", "process")
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir if fcntl else None
+        if self.lock_dir: os.makedirs(self.lock_dir, exist_ok=True)
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0  # calls served by another caller's computation
+
+    def do(self, key, fn, *args, recheck=None, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader: call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None: raise call.error
+            # Followers get their own copy: callers may annotate the result
+            return copy.deepcopy(call.result)
+
+        try:
+            with self._process_lock(key) as waited:
+                result = recheck() if (waited and recheck) else None
+                call.result = result if result else fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock: self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    @contextmanager
+    def _process_lock(self, key):
+        if not self.lock_dir:
+            yield False
+            return
+        path = os.path.join(self.lock_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".lock")
+        with open(path, "a+") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                waited = False
+            except BlockingIOError:
+                fcntl.flock(f, fcntl.LOCK_EX)  # another process is computing it
+                waited = True
+            try:
+                yield waited
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def in_flight(self):
+        with self._lock: return len(self._calls)
+
+
+FLIGHTS = SingleFlight(os.path.join(CACHE_DIR, "locks") if SINGLEFLIGHT_MODE == "file" else None)
@@ -0,0 +1,244 @@
+import os
+import sqlite3
+import threading
+import time
+
+from cache import CACHE_DIR, stable_hash
+from ratelimit import call, wait_time
+from metrics import observe, track
+
+# --- VEO 3.1 BACKGROUND JOBS ---
+# A Veo render takes minutes. Instead of blocking the Streamlit script thread,
+# jobs are recorded in SQLite (prompt + operation name) and a single daemon
+# thread submits / polls them. Jobs still running when the process stops are
+# picked up again on the next start, from their operation name.
+# Several processes may share one cache dir: a worker claims a pending row
+# ('submitting') before the paid generate_videos call, and results only land
+# on the row if it still holds the operation that was polled.
+VEO_MODEL = "veo-3.1-generate-preview"
+
+
+class VideoJobManager:
+    POLL_INITIAL = 5   # seconds
+    POLL_MAX = 60
+    POLL_FACTOR = 1.5
+    ACTIVE = ("pending", "running")
+    CLAIM_TIMEOUT = 600  # a 'submitting' claim older than this belongs to a dead process
+    SWEEP_EVERY = 600
+
+    def __init__(self, client_factory, model=VEO_MODEL, cache_dir=None, ttl=30 * 24 * 3600, max_entries=200):
+        """Finished jobs (and their mp4) expire after ttl; beyond max_entries the least recently requested go first."""
+        self._client_factory = client_factory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._last_sweep = 0
+        self._client = None
+        self.model = model
+        cache_dir = cache_dir or CACHE_DIR
+        self.video_dir = os.path.join(cache_dir, "videos")
+        os.makedirs(self.video_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "video_jobs.sqlite3"), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, prompt TEXT NOT NULL, operation_name TEXT,"
+            " status TEXT NOT NULL, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._wakeup = threading.Event()
+        self._backoff = {}  # job_id -> (next poll time, current interval)
+        self._worker = None
+
+    # --- Public API (called from the Streamlit thread) ---
+    def start(self):
+        with self._lock:
+            if self._worker and self._worker.is_alive(): return
+            self._worker = threading.Thread(target=self._run, name="veo-jobs", daemon=True)
+            self._worker.start()
+
+    def submit(self, prompt):
+        """Queue a render and return its job id. Same prompt = same job (failed jobs are retried)."""
+        job_id = stable_hash([self.model, prompt])[:24]
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None or row[0] == "failed" or (row[0] == "done" and not os.path.exists(self.video_path(job_id))):
+                self._db.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, prompt, operation_name, status, error, created_at, updated_at)"
+                    " VALUES (?, ?, NULL, 'pending', NULL, ?, ?)",
+                    (job_id, prompt, now, now),
+                )
+                self._db.commit()
+                self._backoff.pop(job_id, None)
+            else:
+                # Requested again: keeps the finished render away from eviction
+                self._db.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ? AND status = 'done'", (now, job_id))
+                self._db.commit()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, error, operation_name FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None: return None
+        status = "pending" if row[0] == "submitting" else row[0]
+        job = {"job_id": job_id, "status": status, "error": row[1], "operation_name": row[2]}
+        job["video_path"] = self.video_path(job_id) if row[0] == "done" else None
+        return job
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job is finished; returns the mp4 path or None."""
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] not in self.ACTIVE: return job and job["video_path"]
+            if deadline and time.time() > deadline: return None
+            time.sleep(1)
+
+    def video_path(self, job_id):
+        return os.path.join(self.video_dir, f"{job_id}.mp4")
+
+    # --- Worker ---
+    def _get_client(self):
+        if self._client is None: self._client = self._client_factory()
+        return self._client
+
+    def _active_jobs(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT job_id, prompt, operation_name, created_at FROM jobs"
+                " WHERE status IN (?, ?) OR (status = 'submitting' AND updated_at < ?)",
+                (*self.ACTIVE, time.time() - self.CLAIM_TIMEOUT),
+            ).fetchall()
+
+    def _sweep(self):
+        """Drop expired finished jobs and their files, then the oldest ones over max_entries."""
+        now = time.time()
+        if now - self._last_sweep < self.SWEEP_EVERY: return
+        self._last_sweep = now
+        with self._lock:
+            finished = "status IN ('done', 'failed')"
+            rows = self._db.execute(f"SELECT job_id FROM jobs WHERE {finished} AND updated_at < ?", (now - self.ttl,)).fetchall()
+            count = self._db.execute(f"SELECT COUNT(*) FROM jobs WHERE {finished}").fetchone()[0] - len(rows)
+            if self.max_entries and count > self.max_entries:
+                rows += self._db.execute(
+                    f"SELECT job_id FROM jobs WHERE {finished} AND updated_at >= ? ORDER BY updated_at ASC LIMIT ?",
+                    (now - self.ttl, count - self.max_entries),
+                ).fetchall()
+            for (job_id,) in rows:
+                self._db.execute(f"DELETE FROM jobs WHERE job_id = ? AND {finished}", (job_id,))
+                try: os.remove(self.video_path(job_id))
+                except OSError: pass
+            self._db.commit()
+
+    def _claim(self, job_id):
+        """Atomically take a pending job for submission; False if another worker has it."""
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'submitting', updated_at = ? WHERE job_id = ? AND operation_name IS NULL"
+                " AND (status = 'pending' OR (status = 'submitting' AND updated_at < ?))",
+                (now, job_id, now - self.CLAIM_TIMEOUT),
+            )
+            self._db.commit()
+        return cur.rowcount == 1
+
+    def _update(self, job_id, where=None, **fields):
+        """UPDATE the job; `where` adds column conditions (claim / operation still current). Returns True if applied."""
+        fields["updated_at"] = time.time()
+        where = where or {}
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        conds = "".join(f" AND {k} = ?" for k in where)
+        with self._lock:
+            cur = self._db.execute(f"UPDATE jobs SET {cols} WHERE job_id = ?{conds}", (*fields.values(), job_id, *where.values()))
+            self._db.commit()
+        return cur.rowcount == 1
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            for job_id, prompt, operation_name, created_at in self._active_jobs():
+                if self._backoff.get(job_id, (0, 0))[0] > now: continue
+                try:
+                    status = self._step(job_id, prompt, operation_name)
+                except Exception as e:
+                    print(f"Veo Error: {e}")
+                    self._backoff.pop(job_id, None)
+                    # Only the claim holder / the poller of the current operation may fail the job
+                    where = {"operation_name": operation_name} if operation_name else {"status": "submitting"}
+                    self._update(job_id, where=where, status="failed", error=str(e))
+                    observe("veo_render", time.time() - created_at, outcome="error", error=type(e).__name__)
+                else:
+                    if status == "done": observe("veo_render", time.time() - created_at)
+                    elif status == "failed": observe("veo_render", time.time() - created_at, outcome="empty")
+            self._sweep()
+            next_due = min((t for t, _ in self._backoff.values()), default=now + self.POLL_MAX)
+            self._wakeup.wait(timeout=max(0.5, min(next_due - time.time(), self.POLL_MAX)))
+
+    def _step(self, job_id, prompt, operation_name):
+        # 1. Start Operation (or resume it from its name after a restart)
+        if not operation_name:
+            # Submission rate limit (batch.py --veo-rpm): come back later rather than
+            # blocking this thread, which also polls every other job
+            delay = wait_time("veo_submit")
+            if delay > 0:
+                self._backoff[job_id] = (time.time() + delay, self.POLL_INITIAL / self.POLL_FACTOR)
+                return "queued"
+            if not self._claim(job_id): return "claimed"  # another worker submits it
+            client = self._get_client()
+            with track("veo_submit") as t:
+                t.sent(prompt)
+                operation = call("veo_submit", client.models.generate_videos, model=self.model, prompt=prompt, tracker=t)
+            operation_name = operation.name
+            self._update(job_id, where={"status": "submitting"}, operation_name=operation_name, status="running")
+        else:
+            client = self._get_client()
+            with track("veo_poll") as t:
+                operation = call("veo", client.operations.get, _operation_ref(client, operation_name), tracker=t)
+
+        # 2. Not done yet: poll again later with exponential backoff
+        if not operation.done:
+            interval = self._backoff.get(job_id, (0, self.POLL_INITIAL / self.POLL_FACTOR))[1]
+            interval = min(interval * self.POLL_FACTOR, self.POLL_MAX)
+            self._backoff[job_id] = (time.time() + interval, interval)
+            return "running"
+
+        # 3. Retrieve Result
+        self._backoff.pop(job_id, None)
+        if operation.response and operation.response.generated_videos:
+            with track("veo_download") as t:
+                video_bytes = call("veo", client.files.download, file=operation.response.generated_videos[0].video, tracker=t)
+                t.received(video_bytes)
+            tmp = self.video_path(job_id) + ".tmp"
+            with open(tmp, "wb") as f: f.write(video_bytes)
+            os.replace(tmp, self.video_path(job_id))
+            return "done" if self._update(job_id, where={"operation_name": operation_name}, status="done", error=None) else "stale"
+        error = str(operation.error or "No video returned (API Limit or Safety Filter)")
+        return "failed" if self._update(job_id, where={"operation_name": operation_name}, status="failed", error=error) else "stale"
+
+
+def _operation_ref(client, operation_name):
+    # Imported here: the SDK is already loaded by the client factory (mock clients bring their own type)
+    op_type = getattr(client, "operation_type", None)
+    if op_type is None:
+        from google.genai import types
+        op_type = types.GenerateVideosOperation
+    return op_type(name=operation_name)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_job_manager(client_factory, model=VEO_MODEL):
+    """Process-wide manager (one worker thread), started on first use."""
+    with _managers_lock:
+        if model not in _managers:
+            _managers[model] = VideoJobManager(client_factory, model=model)
+        manager = _managers[model]
+    manager.start()
+    return manager